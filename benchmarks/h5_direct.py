@@ -0,0 +1,48 @@
+# Compare reading gzip-compressed HDF5 data through h5py and through the direct chunk engine
+#
+#   python benchmarks/h5_direct.py [--size 256] [--level 4]
+import argparse
+import os
+import tempfile
+import time
+
+import dask.array as da
+import h5py
+import numpy as np
+
+from graphet.utils import DirectChunkDataset
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=256, help="cube side")
+    parser.add_argument("--chunk", type=int, default=32, help="HDF5 chunk side")
+    parser.add_argument("--level", type=int, default=4, help="gzip level")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    n, c = args.size, args.chunk
+    x, y, z = np.meshgrid(*(np.linspace(0, 2 * np.pi, n),) * 3, indexing="ij")
+    data = np.sin(x) * np.cos(y) * np.sin(2 * z)
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, "data.h5")
+        with h5py.File(fname, "w") as f:
+            f.create_dataset(
+                "a", data=data, chunks=(c, c, c), compression=args.level, shuffle=True
+            )
+        print(f"{n}^3 float64, {c}^3 chunks, {os.path.getsize(fname) / 1e6:.1f} MB")
+        with h5py.File(fname, "r") as f:
+            for engine, arr in [
+                ("h5py", f["a"]),
+                ("direct", DirectChunkDataset(f["a"])),
+            ]:
+                best = float("inf")
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    da.from_array(arr, chunks="auto").sum().compute(scheduler="threads")
+                    best = min(best, time.perf_counter() - start)
+                print(f"{engine:>8}: {best:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
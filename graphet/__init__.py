@@ -2,5 +2,6 @@ __version__ = "0.1.4"
 
 from .data import Data
 from .dashboard import Dashboard
+from .render import render_frames
 
-__all__ = ["Data", "Dashboard"]
+__all__ = ["Data", "Dashboard", "render_frames"]
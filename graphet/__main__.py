@@ -0,0 +1,76 @@
+from typing import List
+
+
+def parse_steps(steps: str) -> range:
+    parts = [int(p) for p in steps.split(":")]
+    if len(parts) == 1:
+        return range(parts[0], parts[0] + 1)
+    return range(*parts)
+
+
+def serve(args) -> None:
+    from .server import SliceServer
+    from .data import Data
+    from . import plugins
+
+    plugin = getattr(plugins, args.plugin)
+    if args.steps is not None:
+        steps = list(parse_steps(args.steps))
+    else:
+        steps = plugin(path=args.path).availableSteps()
+    if not steps:
+        raise SystemExit(f"No steps found in `{args.path}`")
+    data = Data(
+        plugin,
+        steps=steps,
+        path=args.path,
+        cfg_fname=args.cfg,
+        first_step=steps[0],
+        particles=None,
+    )
+    server = SliceServer(
+        data,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        cache_bytes=int(args.cache_bytes),
+    )
+    host, port = server.address
+    print(f"Serving {args.path} at http://{host}:{port}/meta")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+def main(argv: List[str] | None = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="graphet")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    srv = commands.add_parser(
+        "serve", help="serve slices, tiles and spectra of a run over HTTP"
+    )
+    srv.add_argument("path", help="path to the simulation output")
+    srv.add_argument("--plugin", default="TristanV2", help="data reading plugin")
+    srv.add_argument("--cfg", default=None, help="configuration file of the run")
+    srv.add_argument(
+        "--steps", default=None, help="steps as `start:stop[:step]` (default: all)"
+    )
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8765)
+    srv.add_argument("--workers", type=int, default=8, help="concurrent reads")
+    srv.add_argument(
+        "--cache-bytes", type=float, default=256e6, help="size of the response cache"
+    )
+    srv.set_defaults(func=serve)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
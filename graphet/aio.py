@@ -0,0 +1,180 @@
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+
+class AsyncReader:
+    def __init__(self, data: Any, max_workers: int = 8, per_file: int = 2):
+        """
+        Asynchronous facade of a data container for serving it from an event loop. The reads run in a bounded pool of threads, identical requests in flight are coalesced into a single read, and the number of concurrent reads of each file is limited.
+
+        Parameters
+        ----------
+        `data` : `Data`
+            the data container
+        `max_workers` : `int`, optional
+            maximum number of concurrent reads (default: `8`)
+        `per_file` : `int`, optional
+            maximum number of concurrent reads of the files of each step (default: `2`)
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        import weakref
+
+        self.data = data
+        self.per_file = per_file
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="graphet-aio"
+        )
+        # asyncio primitives are bound to their event loop
+        self._loops = weakref.WeakKeyDictionary()
+
+    def state(self) -> Tuple[Dict[str, Any], Dict[Tuple[str, ...], Any]]:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._loops:
+            self._loops[loop] = ({}, {})
+        return self._loops[loop]
+
+    def files(self, step: int) -> Tuple[str, ...]:
+        files = self.data.plugin.sourceFiles([step])
+        return tuple(sorted(files)) if files else (f"step:{step}",)
+
+    async def load(self, obj: Any, step: int) -> Any:
+        """
+        Load a lazy object into memory without blocking the event loop.
+
+        Parameters
+        ----------
+        `obj` : `xr.DataArray | xr.Dataset | da.Array`
+            the object to load
+        `step` : `int`
+            the step the object is read from (used to limit the concurrent reads of its files)
+
+        Returns
+        -------
+        `Any`
+            the loaded object (shared between all the identical requests in flight)
+        """
+        from dask.base import tokenize
+        import asyncio
+
+        inflight, semaphores = self.state()
+        key = tokenize(obj)
+        if key in inflight:
+            return await asyncio.shield(inflight[key])
+
+        async def read() -> Any:
+            loop = asyncio.get_running_loop()
+            # finding the files globs and stats the output directory, which must not block the loop
+            files = await loop.run_in_executor(self.executor, self.files, step)
+            if files not in semaphores:
+                semaphores[files] = asyncio.Semaphore(self.per_file)
+            async with semaphores[files]:
+                return await loop.run_in_executor(
+                    self.executor, lambda: obj.compute(scheduler="synchronous")
+                )
+
+        task = asyncio.ensure_future(read())
+        inflight[key] = task
+        task.add_done_callback(lambda _: inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def select(
+        self, key: str, species: int | None, t: float | None, **sel
+    ) -> Tuple[Any, int]:
+        data = self.data
+        if species is not None:
+            assert data.particles is not None, "Particles not loaded"
+            obj = data.particles[species][key]
+        elif data.fields is not None and key in data.fields:
+            obj = data.fields[key]
+        elif data.spectra is not None and key in data.spectra:
+            obj = data.spectra[key]
+        else:
+            raise KeyError(f"Unknown key `{key}`")
+        if t is not None:
+            obj = obj.sel(t=t, method="nearest")
+            i = int(abs(data.times - obj.t.values[()]).argmin())
+        else:
+            assert len(data.steps) == 1, "Time must be specified"
+            obj, i = obj.isel(t=0), 0
+        if sel:
+            obj = obj.sel(**sel)
+        return obj, int(data.steps[i])
+
+    async def get(
+        self, key: str, species: int | None = None, t: float | None = None, **sel
+    ) -> Any:
+        """
+        Asynchronously read a field, spectrum or particle key at a given time.
+
+        Parameters
+        ----------
+        `key` : `str`
+            the field, spectrum or (with `species`) particle key
+        `species` : `int`, optional
+            the particle species (default: `None`, `key` is a field or a spectrum)
+        `t` : `float`, optional
+            the time (the nearest one is taken); may only be omitted if the container has a single step
+        `**sel` : `Dict[str, Any]`
+            selection along the other dimensions, passed to `xr.DataArray.sel`
+
+        Returns
+        -------
+        `xr.DataArray`
+            the selection loaded into memory
+        """
+        obj, step = self.select(key, species, t, **sel)
+        return await self.load(obj, step)
+
+    async def iter_steps(
+        self,
+        keys: List[str] | None = None,
+        selection: Dict[str, Any] | None = None,
+        prefetch: int = 2,
+    ) -> AsyncIterator[Any]:
+        """
+        Asynchronously iterate over the steps of the field data, reading up to `prefetch` steps ahead.
+
+        Parameters
+        ----------
+        `keys` : `List[str]`, optional
+            the fields to read (default: all fields)
+        `selection` : `Dict[str, Any]`, optional
+            selection to apply to each step, passed to `xr.Dataset.sel` (default: `None`)
+        `prefetch` : `int`, optional
+            maximum number of steps read ahead (default: `2`)
+
+        Yields
+        ------
+        `xr.Dataset`
+            the fields at each step loaded into memory
+        """
+        from collections import deque
+        import asyncio
+
+        data = self.data
+        assert data.fields is not None, "Fields not loaded"
+        if keys is None:
+            keys = list(data.fields.data_vars.keys())
+        ds = data.field_group(keys)
+        if selection is not None:
+            ds = ds.sel(**selection)
+        prefetch = max(1, prefetch)
+        nsteps = ds.sizes["t"]
+
+        def schedule(i: int) -> Any:
+            return asyncio.ensure_future(self.load(ds.isel(t=i), int(data.steps[i])))
+
+        pending = deque(schedule(i) for i in range(min(prefetch, nsteps)))
+        try:
+            for i in range(nsteps):
+                snapshot = await pending.popleft()
+                if i + prefetch < nsteps:
+                    pending.append(schedule(i + prefetch))
+                yield snapshot
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
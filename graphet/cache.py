@@ -0,0 +1,154 @@
+from typing import Any, Dict, Tuple
+
+
+class ResultCache:
+    def __init__(self, path: str, max_bytes: int = 10 * 1000**3):
+        """
+        Persistent on-disk cache of computed results with least-recently-used eviction.
+
+        Parameters
+        ----------
+        `path` : `str`
+            directory to store the results in
+        `max_bytes` : `int`, optional
+            maximum total size of the stored results (default: 10 GB)
+        """
+        import os
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, *parts: Any) -> str:
+        """
+        Build a cache key from any tokenizable objects (including lazy dask/xarray objects).
+
+        Returns
+        -------
+        `str`
+            the key
+        """
+        from dask.base import tokenize
+
+        return tokenize(*parts)
+
+    def fname(self, key: str) -> str:
+        import os
+
+        return os.path.join(self.path, f"{key}.pkl")
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look up a result.
+
+        Parameters
+        ----------
+        `key` : `str`
+            the key
+
+        Returns
+        -------
+        `Tuple[bool, Any]`
+            whether the result was found, and the result (or `None`)
+        """
+        import pickle
+        import os
+
+        fname = self.fname(key)
+        try:
+            with open(fname, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+        # modification time marks the last use for the eviction
+        os.utime(fname)
+        self.hits += 1
+        return True, value
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Store a result, evicting the least recently used ones if the cache is over its size limit.
+
+        Parameters
+        ----------
+        `key` : `str`
+            the key
+        `value` : `Any`
+            the result (must be pickleable)
+        """
+        import pickle
+        import os
+
+        fname = self.fname(key)
+        tmp = f"{fname}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, fname)
+        self.evict()
+
+    def entries(self) -> Dict[str, Tuple[float, int]]:
+        import os
+
+        entries = {}
+        for f in os.listdir(self.path):
+            if f.endswith(".pkl"):
+                try:
+                    st = os.stat(os.path.join(self.path, f))
+                except FileNotFoundError:
+                    continue
+                entries[f[:-4]] = (st.st_mtime, st.st_size)
+        return entries
+
+    def evict(self) -> None:
+        import os
+
+        entries = self.entries()
+        total = sum(size for _, size in entries.values())
+        for key, (_, size) in sorted(entries.items(), key=lambda e: e[1][0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self.fname(key))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self) -> None:
+        import os
+
+        for key in self.entries().keys():
+            try:
+                os.remove(self.fname(key))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Cache statistics of the current session.
+
+        Returns
+        -------
+        `Dict[str, int]`
+            number of hits and misses, number of stored results and their total size in bytes
+        """
+        entries = self.entries()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(entries),
+            "bytes": sum(size for _, size in entries.values()),
+        }
+
+    def __repr__(self) -> str:
+        from .utils import sizeof_fmt
+
+        stats = self.stats
+        return (
+            f"ResultCache({self.path}): {stats['entries']} results "
+            f"[{sizeof_fmt(stats['bytes'])} / {sizeof_fmt(self.max_bytes)}], "
+            f"{stats['hits']} hits, {stats['misses']} misses"
+        )
@@ -1,17 +1,207 @@
 # Preliminary embedding of Dask dashboard
+from typing import Any, Callable, Dict, List, Tuple
+import os
+
+from .utils import prewarm_handles, set_handle_cache_size
+
+NCORES = os.cpu_count() or 1
+
+# h5py serializes all the reads within a process, so for I/O bound workloads it pays off to have
+# many single-threaded worker processes; compute bound workloads prefer fewer, fatter workers
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "io-heavy": {
+        "cluster": {
+            "processes": True,
+            "n_workers": NCORES,
+            "threads_per_worker": 1,
+            "memory_limit": "auto",
+        },
+        "memory": {"target": 0.6, "spill": 0.7, "pause": 0.85, "terminate": 0.95},
+        "handle_cache": 1024,
+    },
+    "compute-heavy": {
+        "cluster": {
+            "processes": True,
+            "n_workers": max(1, NCORES // 4),
+            "threads_per_worker": min(4, NCORES),
+            "memory_limit": "auto",
+        },
+        "memory": {"target": 0.7, "spill": 0.8, "pause": 0.9, "terminate": 0.95},
+        "handle_cache": 256,
+    },
+    "low-memory": {
+        "cluster": {
+            "processes": True,
+            "n_workers": max(1, NCORES // 2),
+            "threads_per_worker": 1,
+            "memory_limit": "auto",
+        },
+        "memory": {"target": 0.4, "spill": 0.5, "pause": 0.7, "terminate": 0.9},
+        "handle_cache": 64,
+    },
+}
+
+
+def profile_config(
+    profile: str, **kwargs
+) -> Tuple[Dict[str, Any], Dict[str, Any], int]:
+    """
+    Resolve a named cluster profile.
+
+    Parameters
+    ----------
+    `profile` : `str`
+        name of the profile (one of the keys of `PROFILES`)
+    `**kwargs` : `Dict[str, Any]`
+        keyword arguments to `LocalCluster` overriding the ones from the profile
+
+    Returns
+    -------
+    `Tuple[Dict[str, Any], Dict[str, Any], int]`
+        keyword arguments to `LocalCluster`, dask config to start the cluster with, and the size of the per-worker file handle cache
+
+    Raises
+    ------
+    `ValueError`
+        if the profile is unknown
+    """
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown profile `{profile}`, available: {list(PROFILES.keys())}"
+        )
+    prof = PROFILES[profile]
+    cluster_kwargs = {**prof["cluster"], **kwargs}
+    config = {f"distributed.worker.memory.{k}": v for k, v in prof["memory"].items()}
+    return cluster_kwargs, config, prof["handle_cache"]
+
+
+def handle_cache_plugin(maxsize: int, fnames: List[str] | None = None) -> Any:
+    """
+    Worker plugin sizing the cache of open HDF5 files on each worker and opening the given files in advance.
+
+    Parameters
+    ----------
+    `maxsize` : `int`
+        maximum number of simultaneously open files per worker
+    `fnames` : `List[str]`, optional
+        files to open on startup (default: `None`, none)
+
+    Returns
+    -------
+    `WorkerPlugin`
+        the plugin to register with the client
+    """
+    # `distributed` is only needed (and imported) once a cluster is used
+    from distributed import WorkerPlugin
+
+    class HandleCachePlugin(WorkerPlugin):
+        def __init__(self, maxsize: int, fnames: List[str]):
+            self.maxsize = maxsize
+            self.fnames = fnames
+
+        def setup(self, worker):
+            set_handle_cache_size(self.maxsize)
+            prewarm_handles(self.fnames)
+
+    return HandleCachePlugin(maxsize, fnames or [])
 
 
 class Dashboard:
-    def __init__(self, **kwargs):
-        from dask.distributed import Client
+    def __init__(self, profile: str | None = None, **kwargs):
+        """
+        Dask client with a locally hosted dashboard.
+
+        Parameters
+        ----------
+        `profile` : `str`, optional
+            named local cluster profile to start (`"io-heavy"`, `"compute-heavy"` or `"low-memory"`); if `None`, `kwargs` are passed to `Client` as is (default: `None`)
+        `**kwargs` : `Dict[str, Any]`
+            keyword arguments to pass to `Client` (or to `LocalCluster` when a profile is used)
+        """
+        import dask.config
+        from dask.distributed import Client, LocalCluster
+
+        self.profile = profile
+        self._cluster = None
+        self._handle_cache = None
+        if profile is None:
+            self._client = Client(**kwargs)
+        else:
+            cluster_kwargs, config, self._handle_cache = profile_config(
+                profile, **kwargs
+            )
+            with dask.config.set(config):
+                self._cluster = LocalCluster(**cluster_kwargs)
+            self._client = Client(self._cluster)
+            self._client.register_plugin(
+                handle_cache_plugin(self._handle_cache), name="graphet-handles"
+            )
+
+    def prewarm(self, data) -> None:
+        """
+        Open all the files of a `Data` container in the file handle caches of the workers.
+
+        Parameters
+        ----------
+        `data` : `Data`
+            the data container
+        """
+        self._client.register_plugin(
+            handle_cache_plugin(
+                self._handle_cache or 1024,
+                data.plugin.sourceFiles(list(data.steps)),
+            ),
+            name="graphet-handles",
+        )
+
+    @staticmethod
+    def benchmark(
+        func: Callable[[], Any],
+        profiles: List[str | None] | None = None,
+        repeat: int = 3,
+    ) -> Dict[str, float]:
+        """
+        Time a workload on a fresh cluster for each profile.
+
+        Parameters
+        ----------
+        `func` : `Callable[[], Any]`
+            the workload, e.g. `lambda: d.fields.bx.mean().compute()`
+        `profiles` : `List[str | None]`, optional
+            profiles to compare, `None` standing for the default client (default: the default client and all the named profiles)
+        `repeat` : `int`, optional
+            number of timed runs per profile, the best one is reported (default: `3`)
+
+        Returns
+        -------
+        `Dict[str, float]`
+            best wall time in seconds for each profile
+        """
+        import time
 
-        self._client = Client(**kwargs)
+        if profiles is None:
+            profiles = [None, *PROFILES.keys()]
+        timings = {}
+        for profile in profiles:
+            dashboard = Dashboard(profile)
+            try:
+                best = float("inf")
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    func()
+                    best = min(best, time.perf_counter() - start)
+            finally:
+                dashboard.close()
+            timings[profile or "default"] = best
+        return timings
 
     def restart(self):
         self._client.restart()
 
     def close(self):
         self._client.close()
+        if self._cluster is not None:
+            self._cluster.close()
 
     @property
     def client(self):
@@ -1,6 +1,7 @@
-from typing import List, Type
+from typing import Any, AsyncIterator, Dict, Iterator, List, Type
 import logging
 from .plugin import Plugin
+from .cache import ResultCache
 from .utils import array_t, sizeof_fmt
 
 
@@ -10,6 +11,12 @@ class Data:
         plugin: Type[Plugin],
         steps: List[int],
         loglevel: int = logging.ERROR,
+        cache: str | None = None,
+        cache_size: int = 10 * 1000**3,
+        eager_bytes: int = 64 * 1000**2,
+        memory_budget: int | None = None,
+        over_budget: str = "raise",
+        trajectories: str | None = None,
         **kwargs,
     ):
         """
@@ -21,6 +28,18 @@ class Data:
             the data reading plugin to use
         `steps` : `List[int]`
             the steps to read
+        `cache` : `str`, optional
+            directory of the persistent cache of results computed with `Data.compute` (default: `None`, no caching)
+        `cache_size` : `int`, optional
+            maximum size of the result cache in bytes (default: 10 GB)
+        `eager_bytes` : `int`, optional
+            spectra smaller than this (in total over all the steps) are read into memory at once instead of being loaded lazily (default: 64 MB)
+        `memory_budget` : `int`, optional
+            maximum estimated peak memory of the computations run with `Data.compute` (default: `None`, no limit)
+        `over_budget` : `str`, optional
+            what to do with computations over the memory budget: `"raise"` a `MemoryError`, or `"stream"` them in batches of steps when their result fits in the budget (default: `"raise"`)
+        `trajectories` : `str`, optional
+            read the particles from this trajectory store (see `Data.to_trajectories`) instead of the step files, so the trajectories of any set of particles are read with a few contiguous reads (default: `None`)
         `**kwargs`: `Dict[str, Any]`
             the keyword arguments to pass to the plugin
         """
@@ -42,6 +61,14 @@ class Data:
             ]
 
         self.steps = np.array(steps)
+        self.cache = ResultCache(cache, cache_size) if cache is not None else None
+        self._aio = None
+        if over_budget not in ["raise", "stream"]:
+            raise ValueError(
+                f"Unknown over_budget `{over_budget}`, must be `raise` or `stream`"
+            )
+        self.memory_budget = memory_budget
+        self.over_budget = over_budget
 
         self.plugin = plugin(**kwargs)
         if self.plugin.params:
@@ -90,7 +117,30 @@ class Data:
                 self.fields = None
 
             # load particle metadata
-            if self.plugin.particles is not None:
+            if self.plugin.particles is not None and trajectories is not None:
+                from .trajectories import read_trajectories
+
+                self.particles = {}
+                patterns = self.plugin.particles
+                stored = read_trajectories(trajectories, list(self.steps))
+                for sp in self.plugin.matchKeys(
+                    list(stored.keys()),
+                    [p for p in patterns if isinstance(p, int)],
+                    strict=False,
+                ):
+                    keys = self.plugin.matchKeys(
+                        [k for k in stored[sp].keys() if k != "idx"],
+                        [p for p in patterns if isinstance(p, str)],
+                        strict=False,
+                    )
+                    self.particles[sp] = xr.Dataset(
+                        {
+                            k: xr.DataArray(stored[sp][k].T, dims=["t", "idx"])
+                            for k in keys
+                        },
+                        coords={"t": self.times, "idx": stored[sp]["idx"]},
+                    )
+            elif self.plugin.particles is not None:
                 self.particles = {}
                 prtl_species = self.plugin.prtlSpecies()
                 for sp in prtl_species:
@@ -128,17 +178,17 @@ class Data:
             if self.plugin.spectra is not None:
                 self.spectra = xr.Dataset()
                 spec_keys = self.plugin.specKeys()
-                datasets = {}
-                for s in self.steps:
-                    for sk in spec_keys:
-                        if sk not in datasets.keys():
-                            datasets[sk] = []
-                        datasets[sk].append(self.plugin.spectrum(sk, s))
-
                 for sk in spec_keys:
                     spec_bins = self.plugin.specBins(sk)
+                    nbytes = self.plugin.readSpectrum(sk, self.steps[0]).nbytes
+                    if nbytes * len(self.steps) <= eager_bytes:
+                        spectrum = self.plugin.spectrumStack(sk, list(self.steps))
+                    else:
+                        spectrum = da_stack(
+                            [self.plugin.spectrum(sk, s) for s in self.steps], axis=0
+                        )
                     self.spectra[sk] = xr.DataArray(
-                        da_stack(datasets[sk], axis=0),
+                        spectrum,
                         dims=["t", *list(spec_bins.keys())],
                         coords={"t": self.times, **spec_bins},
                     )
@@ -147,6 +197,609 @@ class Data:
 
         print(self)
 
+    def compute(self, obj: Any, cache: bool = True) -> Any:
+        """
+        Compute a lazy object, reusing the result from the persistent cache if the data has not changed since it was stored.
+
+        The results are keyed by the token of the dask graph (which includes the names and modification times of the files read), and by the plugin used.
+
+        Parameters
+        ----------
+        `obj` : `xr.DataArray | xr.Dataset | da.Array`
+            the object to compute
+        `cache` : `bool`, optional
+            whether to use the cache, if enabled for the container (default: `True`)
+
+        Returns
+        -------
+        `Any`
+            the computed object
+        """
+        from . import __version__
+
+        if self.cache is None or not cache:
+            return self.guarded_compute(obj)
+        plugin_id = (
+            f"{type(self.plugin).__module__}.{type(self.plugin).__qualname__}",
+            __version__,
+        )
+        key = self.cache.key(obj, plugin_id)
+        hit, value = self.cache.get(key)
+        if not hit:
+            value = self.guarded_compute(obj)
+            self.cache.put(key, value)
+        return value
+
+    def to_trajectories(
+        self,
+        path: str,
+        species: List[int] | None = None,
+        keys: List[str] | None = None,
+        executor: Any = None,
+        buffer_bytes: int = 256 * 1000**2,
+    ) -> str:
+        """
+        Convert the particles of all the steps of the container into a particle-major trajectory store, which can then be read with `Data(..., trajectories=path)` (see `graphet.trajectories.build_trajectories`). The conversion is resumable: running it again only converts the steps not yet written.
+
+        Parameters
+        ----------
+        `path` : `str`
+            the path of the store
+        `species` : `List[int]`, optional
+            the particle species (default: all loaded species)
+        `keys` : `List[str]`, optional
+            the particle keys (default: all loaded keys, except `ind` and `proc`)
+        `executor` : `concurrent.futures.Executor | Client | Dashboard`, optional
+            where to read the steps (default: a thread pool)
+        `buffer_bytes` : `int`, optional
+            memory budget of the block of steps buffered before being written (default: 256 MB)
+
+        Returns
+        -------
+        `str`
+            the path of the store
+        """
+        from .trajectories import build_trajectories
+
+        return build_trajectories(
+            self.plugin,
+            path,
+            list(self.steps),
+            species=species,
+            keys=keys,
+            buffer_bytes=buffer_bytes,
+            executor=executor,
+        )
+
+    def estimate(self, obj: Any) -> Dict[str, int]:
+        """
+        Estimate the cost of computing a lazy object from its task graph and the metadata of the files it reads, without reading any data (see `graphet.estimate.estimate`).
+
+        Parameters
+        ----------
+        `obj` : `xr.DataArray | xr.Dataset | da.Array`
+            the lazy object
+
+        Returns
+        -------
+        `Dict[str, int]`
+            bytes read from disk, size of the result, size of the arrays already in memory it uses, estimated peak memory, number of files read and number of tasks
+
+        Example
+        -------
+        `d.estimate(d.fields.bx.sel(x=0.1, method="nearest"))`
+        """
+        from .estimate import estimate
+
+        return estimate(obj)
+
+    def guarded_compute(self, obj: Any) -> Any:
+        """
+        Compute a lazy object, enforcing the memory budget of the container: computations whose estimated peak memory exceeds it either raise a `MemoryError`, or (with `over_budget="stream"`) are computed in batches of steps written into the preallocated result.
+        """
+        import numpy as np
+        import xarray as xr
+
+        if self.memory_budget is None:
+            return obj.compute()
+        cost = self.estimate(obj)
+        if cost["peak_bytes"] <= self.memory_budget:
+            return obj.compute()
+
+        message = (
+            f"Estimated peak memory {sizeof_fmt(cost['peak_bytes'])} exceeds the budget "
+            f"of {sizeof_fmt(self.memory_budget)} (reading {sizeof_fmt(cost['read_bytes'])} "
+            f"from {cost['files']} files in {cost['tasks']} tasks, "
+            f"result {sizeof_fmt(cost['result_bytes'])}, "
+            f"{sizeof_fmt(cost['resident_bytes'])} already in memory)"
+        )
+        streamable = isinstance(obj, (xr.DataArray, xr.Dataset)) and "t" in obj.dims
+        if self.over_budget == "raise" or not streamable:
+            raise MemoryError(
+                message + "; reduce the selection, or set `over_budget='stream'`"
+                if self.over_budget == "raise"
+                else message + "; only results along `t` can be streamed"
+            )
+
+        # the result is preallocated, so only the current batch is held twice
+        nsteps = obj.sizes["t"]
+        step_bytes = cost["result_bytes"] / nsteps
+        transient = cost["peak_bytes"] - 2 * cost["result_bytes"]
+        batch = int(
+            (self.memory_budget - cost["result_bytes"] - transient) // (2 * step_bytes)
+            if step_bytes > 0
+            else nsteps
+        )
+        if batch < 1:
+            raise MemoryError(message + "; the result does not fit in the budget")
+        logging.info(f"{message}: streaming {batch} steps at a time")
+
+        def allocate(arr: Any) -> Any:
+            if "t" not in arr.dims:
+                return arr.compute()
+            return arr.copy(data=np.empty(arr.shape, dtype=arr.dtype))
+
+        if isinstance(obj, xr.DataArray):
+            result = allocate(obj)
+            streamed, targets = obj, {None: result}
+        else:
+            result = obj.copy(data={k: allocate(v).data for k, v in obj.items()})
+            keys = [k for k, v in obj.data_vars.items() if "t" in v.dims]
+            streamed, targets = obj[keys], {k: result[k] for k in keys}
+        for start in range(0, nsteps, batch):
+            window = {"t": slice(start, start + batch)}
+            part = streamed.isel(window).compute()
+            for k, target in targets.items():
+                target[window] = part if k is None else part[k]
+        return result
+
+    def deposit(
+        self,
+        species: int,
+        weights: Any = None,
+        mask: Any = None,
+        shape: str = "CIC",
+        t: Any = None,
+    ) -> Any:
+        """
+        Deposit a moment of the particle distribution (e.g., density or current) onto the field grid. The particles of each step are deposited chunk by chunk in parallel, and the partial grids are summed.
+
+        Parameters
+        ----------
+        `species` : `int`
+            the particle species
+        `weights` : `str | Callable[[xr.Dataset], xr.DataArray] | float`, optional
+            the particle key, or a function of the particle dataset, to deposit (default: `None`, i.e., number density), e.g., `lambda p: p.u` for the x-current
+        `mask` : `str | Callable[[xr.Dataset], xr.DataArray]`, optional
+            a function of the particle dataset selecting the particles to deposit (default: `None`, all particles), e.g., `lambda p: np.sqrt(1 + p.u**2 + p.v**2 + p.w**2) > 10`
+        `shape` : `str`, optional
+            the particle shape function, `"NGP"` or `"CIC"` (default: `"CIC"`)
+        `t` : `Any`, optional
+            time selection, passed to `xr.Dataset.sel` (default: `None`, all steps)
+
+        Returns
+        -------
+        `xr.DataArray`
+            the lazily computed moment, with the same dimensions and coordinates as the fields
+        """
+        from dask.array.core import stack as da_stack
+        from dask.array.core import from_delayed as da_from_delayed
+        from dask.delayed import delayed
+        import xarray as xr
+        import numpy as np
+        from .grid import grid_geometry, deposit, expression, particle_blocks
+
+        assert self.fields is not None, "Fields not loaded"
+        assert self.particles is not None, "Particles not loaded"
+        field = self.fields[list(self.fields.data_vars.keys())[0]]
+        dims = [d for d in field.dims if d != "t"]
+        geometry = grid_geometry([self.fields[d].values for d in dims])
+
+        prtls = self.particles[species]
+        if t is not None:
+            prtls = prtls.sel(t=t)
+            if "t" not in prtls.dims:
+                prtls = prtls.expand_dims("t")
+
+        def as_data(arr: Any) -> Any:
+            return arr.data if isinstance(arr, xr.DataArray) else arr
+
+        grids = []
+        for i in range(prtls.sizes["t"]):
+            step = prtls.isel(t=i)
+            arrays = {d: step[d].data for d in dims}
+            arrays["weights"] = as_data(expression(step, weights))
+            arrays["mask"] = as_data(expression(step, mask))
+            if arrays["weights"] is None:
+                arrays["weights"] = 1.0
+            partial = [
+                da_from_delayed(
+                    delayed(deposit)(
+                        [block[d] for d in dims],
+                        block["weights"],
+                        block["mask"],
+                        geometry,
+                        shape,
+                    ),
+                    shape=geometry[2],
+                    dtype=np.float64,
+                )
+                for block in particle_blocks(arrays)
+            ]
+            grids.append(da_stack(partial, axis=0).sum(axis=0))
+        return xr.DataArray(
+            da_stack(grids, axis=0),
+            dims=["t", *dims],
+            coords={"t": prtls.t.values, **{d: self.fields[d].values for d in dims}},
+        )
+
+    def gather(
+        self,
+        species: int,
+        fields: List[str],
+        t: Any = None,
+        order: str = "linear",
+    ) -> Any:
+        """
+        Interpolate fields at the positions of the particles (e.g., the magnetic field seen by each particle). At each step, the particles are bucketed by the field chunks their interpolation stencil touches, and every chunk (read once for all the requested fields) is interpolated at the particles of its bucket by its own task. Particles within a cell beyond the outermost nodes get the values at these nodes, while particles farther out of the grid (or with undefined positions) get `NaN`.
+
+        Parameters
+        ----------
+        `species` : `int`
+            the particle species
+        `fields` : `List[str]`
+            the fields to interpolate
+        `t` : `Any`, optional
+            time selection, passed to `xr.Dataset.sel` (default: `None`, all steps)
+        `order` : `str`, optional
+            `"NGP"` (value at the nearest node) or `"linear"` (multilinear interpolation) (default: `"linear"`)
+
+        Returns
+        -------
+        `xr.Dataset`
+            the lazily computed fields at the particle positions, with the same dimensions and coordinates as the particles
+
+        Example
+        -------
+        `b = d.gather(1, ["bx", "by", "bz"], t=2.5)`
+        """
+        from dask.array.core import stack as da_stack
+        from dask.array.core import from_delayed as da_from_delayed
+        from dask.delayed import delayed
+        import xarray as xr
+        import numpy as np
+        import itertools
+        from .grid import grid_geometry, chunk_buckets, gather_chunk, assemble
+
+        orders = {"NGP": "NGP", "linear": "CIC"}
+        if order not in orders:
+            raise ValueError(f"Unknown order `{order}`, must be one of {list(orders)}")
+        shape = orders[order]
+        assert self.particles is not None, "Particles not loaded"
+        group = self.field_group(fields)
+        prtls = self.particles[species]
+        if t is not None:
+            group, prtls = group.sel(t=t), prtls.sel(t=t)
+            if "t" not in prtls.dims:
+                group, prtls = group.expand_dims("t"), prtls.expand_dims("t")
+        dims = [d for d in group[fields[0]].dims if d != "t"]
+        geometry = grid_geometry([group[d].values for d in dims])
+        nprtls = prtls.sizes["idx"]
+
+        gathered = {f: [] for f in fields}
+        for i in range(prtls.sizes["t"]):
+            positions = delayed(list, pure=True)(
+                [prtls[d].isel(t=i).data for d in dims]
+            )
+            arrays = {f: group[f].isel(t=i).data for f in fields}
+            chunks = arrays[fields[0]].chunks
+            starts = [np.cumsum((0,) + c) for c in chunks]
+            buckets = delayed(chunk_buckets, pure=True)(
+                positions, geometry, chunks, shape
+            )
+            for f, arr in arrays.items():
+                blocks = arr.rechunk(chunks).to_delayed()
+                parts = [
+                    delayed(gather_chunk, pure=True)(
+                        blocks[idx],
+                        tuple(int(s[j]) for s, j in zip(starts, idx)),
+                        positions,
+                        buckets.get(idx, np.zeros(0, dtype=np.int64)),
+                        geometry,
+                        shape,
+                    )
+                    for idx in itertools.product(*(range(len(c)) for c in chunks))
+                ]
+                gathered[f].append(
+                    da_from_delayed(
+                        delayed(assemble, pure=True)(nprtls, *parts),
+                        shape=(nprtls,),
+                        dtype=np.float64,
+                    )
+                )
+        return xr.Dataset(
+            {
+                f: xr.DataArray(da_stack(gathered[f], axis=0), dims=["t", "idx"])
+                for f in fields
+            },
+            coords={
+                k: v for k, v in prtls.coords.items() if set(v.dims) <= {"t", "idx"}
+            },
+        )
+
+    def power_spectrum(
+        self,
+        keys: List[str],
+        t: Any = None,
+        bins: Any = None,
+    ) -> Any:
+        """
+        Shell-averaged power spectra of the fields, e.g., `["bx", "by", "bz"]` for the magnetic energy spectrum. All the fields of a step are read together and each step is transformed by its own task, with the whole step rechunked into a single block (so the memory use is bounded by a few steps per worker). The binning of the modes is computed once and shared by all the steps.
+
+        Parameters
+        ----------
+        `keys` : `List[str]`
+            the fields, the spectrum of the sum of their squares is computed
+        `t` : `Any`, optional
+            time selection, passed to `xr.Dataset.sel` (default: `None`, all steps)
+        `bins` : `int | np.array`, optional
+            number of linearly spaced `|k|` bins, or the bin edges (default: `None`, bins as wide as the smallest wavenumber of the box)
+
+        Returns
+        -------
+        `xr.DataArray`
+            the lazily computed spectra with dimensions `t` and `k`; their sum over `k` equals the mean of the sum of the squared fields
+        """
+        import xarray as xr
+        from .grid import grid_geometry
+        from .fourier import SpectrumPlan, power_spectra
+
+        if not keys:
+            raise ValueError("At least one field is required for a power spectrum")
+        group = self.field_group(keys)
+        if t is not None:
+            group = group.sel(t=t)
+            if "t" not in group.dims:
+                group = group.expand_dims("t")
+        dims = [d for d in group[keys[0]].dims if d != "t"]
+        _, spacing, shape = grid_geometry([group[d].values for d in dims])
+        plan = SpectrumPlan(shape, spacing, bins)
+        spectra = power_spectra(
+            [[group[k].isel(t=i).data for k in keys] for i in range(group.sizes["t"])],
+            plan,
+        )
+        return xr.DataArray(
+            spectra,
+            dims=["t", "k"],
+            coords={"t": group.t.values, "k": plan.centers},
+            attrs={"k_edges": plan.edges},
+        )
+
+    def field_group(self, keys: List[str] | None = None) -> Any:
+        """
+        Lazily load several fields with grouped reads: at each step, each chunk region of the step file is read by a single task loading all the requested fields at once. Use instead of `Data.fields` for computations involving all of these fields together (e.g., `|B|^2`).
+
+        Parameters
+        ----------
+        `keys` : `List[str]`, optional
+            the fields (default: all fields)
+
+        Returns
+        -------
+        `xr.Dataset`
+            the fields
+        """
+        from dask.array.core import stack as da_stack
+        import xarray as xr
+
+        assert self.fields is not None, "Fields not loaded"
+        if keys is None:
+            keys = list(self.fields.data_vars.keys())
+        groups = [self.plugin.fieldGroup(keys, s) for s in self.steps]
+        return xr.Dataset(
+            {
+                k: xr.DataArray(
+                    da_stack([g[k] for g in groups], axis=0),
+                    dims=self.fields[k].dims,
+                    coords=self.fields[k].coords,
+                    name=k,
+                )
+                for k in keys
+            }
+        )
+
+    def field_stats(
+        self,
+        keys: List[str] | None = None,
+        quantiles: List[float] | None = None,
+        sketch_size: int = 1001,
+    ) -> Any:
+        """
+        Compute statistics of the fields at every step and over the whole run in a single pass over the data. Every step file is read by one task, which loads all the requested fields while the file is open and summarizes them into mergeable statistics; the tasks run in parallel (on the current dask scheduler).
+
+        Parameters
+        ----------
+        `keys` : `List[str]`, optional
+            the fields (default: all fields)
+        `quantiles` : `List[float]`, optional
+            the quantiles to estimate (default: `None`, `[0.01, 0.5, 0.99]`)
+        `sketch_size` : `int`, optional
+            resolution of the quantile sketches; global quantiles are accurate to about `1 / sketch_size` in rank (default: `1001`)
+
+        Returns
+        -------
+        `xr.Dataset`
+            `min`, `max`, `mean`, `rms` and `quantiles` of each field at each step, and the same statistics over all the steps (prefixed with `global_`)
+        """
+        from dask.delayed import delayed
+        import dask
+        import xarray as xr
+        import numpy as np
+        from .stats import summarize, sketch_quantiles
+
+        assert self.fields is not None, "Fields not loaded"
+        if keys is None:
+            keys = list(self.fields.data_vars.keys())
+        if quantiles is None:
+            quantiles = [0.01, 0.5, 0.99]
+        plugin = self.plugin
+
+        def summarize_step(step: int) -> List[Dict[str, Any]]:
+            (group,) = dask.compute(
+                plugin.fieldGroup(keys, step), scheduler="synchronous"
+            )
+            return [summarize(group[k], sketch_size) for k in keys]
+
+        summaries = dask.compute(*[delayed(summarize_step)(s) for s in self.steps])
+
+        def collect(stat: str) -> Any:
+            return np.array(
+                [[step[i][stat] for step in summaries] for i in range(len(keys))]
+            )
+
+        counts, sums, sumsqs = collect("count"), collect("sum"), collect("sumsq")
+        sketches = collect("sketch")
+        qs = np.linspace(0, 1, sketch_size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            stats = xr.Dataset(
+                {
+                    "min": (["key", "t"], collect("min")),
+                    "max": (["key", "t"], collect("max")),
+                    "mean": (["key", "t"], sums / counts),
+                    "rms": (["key", "t"], np.sqrt(sumsqs / counts)),
+                    "quantiles": (
+                        ["key", "t", "quantile"],
+                        np.array(
+                            [
+                                [np.interp(quantiles, qs, sk) for sk in sketches[i]]
+                                for i in range(len(keys))
+                            ]
+                        ),
+                    ),
+                    "global_min": (["key"], np.nanmin(collect("min"), axis=1)),
+                    "global_max": (["key"], np.nanmax(collect("max"), axis=1)),
+                    "global_mean": (["key"], sums.sum(axis=1) / counts.sum(axis=1)),
+                    "global_rms": (
+                        ["key"],
+                        np.sqrt(sumsqs.sum(axis=1) / counts.sum(axis=1)),
+                    ),
+                    "global_quantiles": (
+                        ["key", "quantile"],
+                        np.array(
+                            [
+                                sketch_quantiles(
+                                    list(sketches[i]), list(counts[i]), quantiles
+                                )
+                                for i in range(len(keys))
+                            ]
+                        ),
+                    ),
+                },
+                coords={"key": keys, "t": self.times, "quantile": quantiles},
+            )
+        return stats
+
+    def iter_steps(
+        self,
+        keys: List[str] | None = None,
+        selection: Dict[str, Any] | None = None,
+        prefetch: int = 2,
+        max_bytes: int | None = None,
+    ) -> Iterator[Any]:
+        """
+        Iterate over the steps of the field data, reading the next steps in background threads while the current one is being processed.
+
+        Parameters
+        ----------
+        `keys` : `List[str]`, optional
+            the fields to read (default: all fields)
+        `selection` : `Dict[str, Any]`, optional
+            selection to apply to each step, passed to `xr.Dataset.sel` (default: `None`)
+        `prefetch` : `int`, optional
+            maximum number of steps read ahead (default: `2`)
+        `max_bytes` : `int`, optional
+            memory budget for the steps read ahead; limits `prefetch` to at least one step (default: `None`)
+
+        Yields
+        ------
+        `xr.Dataset`
+            the fields at each step loaded into memory
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        from collections import deque
+
+        assert self.fields is not None, "Fields not loaded"
+        if keys is None:
+            keys = list(self.fields.data_vars.keys())
+        ds = self.field_group(keys)
+        if selection is not None:
+            ds = ds.sel(**selection)
+        if max_bytes is not None:
+            step_bytes = ds.isel(t=0).nbytes
+            prefetch = min(prefetch, max(1, int(max_bytes // max(step_bytes, 1))))
+        prefetch = max(1, prefetch)
+
+        def load(i: int):
+            return ds.isel(t=i).compute(scheduler="synchronous")
+
+        executor = ThreadPoolExecutor(max_workers=prefetch)
+        try:
+            pending = deque()
+            nsteps = ds.sizes["t"]
+            for i in range(min(prefetch, nsteps)):
+                pending.append(executor.submit(load, i))
+            for i in range(nsteps):
+                snapshot = pending.popleft().result()
+                if i + prefetch < nsteps:
+                    pending.append(executor.submit(load, i + prefetch))
+                yield snapshot
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def aio(self) -> Any:
+        """
+        Asynchronous reader of the container (see `graphet.aio.AsyncReader`), created on first use with the default limits; assign a new `AsyncReader` to change them.
+        """
+        from .aio import AsyncReader
+
+        if self._aio is None:
+            self._aio = AsyncReader(self)
+        return self._aio
+
+    @aio.setter
+    def aio(self, reader: Any) -> None:
+        if self._aio is not None and self._aio is not reader:
+            self._aio.close()
+        self._aio = reader
+
+    async def aget(
+        self, key: str, species: int | None = None, t: float | None = None, **sel
+    ) -> Any:
+        """
+        Asynchronously read a field, spectrum or particle key at a given time without blocking the event loop (see `graphet.aio.AsyncReader.get`).
+
+        Example
+        -------
+        `bx = await d.aget("bx", t=2.5, x=slice(0, 1))`
+        """
+        return await self.aio.get(key, species=species, t=t, **sel)
+
+    def aiter_steps(
+        self,
+        keys: List[str] | None = None,
+        selection: Dict[str, Any] | None = None,
+        prefetch: int = 2,
+    ) -> AsyncIterator[Any]:
+        """
+        Asynchronous version of `Data.iter_steps` (see `graphet.aio.AsyncReader.iter_steps`).
+
+        Example
+        -------
+        `async for snapshot in d.aiter_steps(["bx", "by"]): ...`
+        """
+        return self.aio.iter_steps(keys, selection, prefetch)
+
     def __repr__(self) -> str:
         format_str = "{ Graph-ET Data Container }\n\n"
 
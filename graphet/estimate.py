@@ -0,0 +1,183 @@
+from typing import Any, Dict, List, Tuple
+
+
+def source_files(ds: Any) -> List[str]:
+    """
+    Find the files an array-like dataset (an HDF5 dataset or any of its wrappers) reads from.
+    """
+    while hasattr(ds, "ds"):
+        ds = ds.ds
+    if hasattr(ds, "datasets"):
+        return sorted({f for d in ds.datasets.values() for f in source_files(d)})
+    try:
+        return [ds.file.filename]
+    except (AttributeError, ValueError):
+        return []
+
+
+def is_dataset(obj: Any) -> bool:
+    """
+    Whether an object of the graph is an on-disk array-like dataset (as opposed to data already in memory).
+    """
+    import numpy as np
+
+    return (
+        hasattr(obj, "shape")
+        and hasattr(obj, "dtype")
+        and not isinstance(obj, (np.ndarray, np.generic))
+        and not hasattr(obj, "__dask_graph__")
+    )
+
+
+def selection_size(sel: Any, shape: Tuple[int, ...]) -> int:
+    """
+    Number of elements of a dataset selected by a tuple of slices and indices.
+    """
+    sel = sel if isinstance(sel, tuple) else (sel,)
+    size = 1
+    for i, n in enumerate(shape):
+        s = sel[i] if i < len(sel) else slice(None)
+        if isinstance(s, slice):
+            size *= len(range(*s.indices(n)))
+    return size
+
+
+def read_cost(task: Any, graph: Dict[Any, Any]) -> Tuple[int, List[str]] | None:
+    """
+    Bytes read from disk by a task of a low-level graph, and the files they are read from (or `None` if the task does not read from disk).
+    """
+    from .plugin import GroupReader
+
+    try:
+        from dask._task_spec import DataNode, Task, TaskRef
+    except ImportError:
+        # older dask (before 2024.12) builds graphs of plain `(func, *args)` tuples
+        DataNode = Task = TaskRef = ()
+
+    if isinstance(task, Task):
+        func = task.func
+        args = [
+            (
+                a.value
+                if isinstance(a, DataNode)
+                else a.key if isinstance(a, TaskRef) else a
+            )
+            for a in task.args
+        ]
+    elif isinstance(task, tuple) and task and callable(task[0]):
+        func, args = task[0], list(task[1:])
+    else:
+        return None
+
+    if isinstance(func, GroupReader) and args:
+        datasets = list(func.datasets.values())
+        size = selection_size(args[0], datasets[0].shape)
+        return sum(size * d.dtype.itemsize for d in datasets), source_files(func)
+    if len(args) >= 2:
+        try:
+            source = graph.get(args[0])
+        except TypeError:
+            return None
+        if is_dataset(source):
+            size = selection_size(args[1], source.shape)
+            return size * source.dtype.itemsize, source_files(source)
+    return None
+
+
+def resident_arrays(node: Any, found: Dict[int, int]) -> None:
+    """
+    Collect the arrays already in memory embedded in a node of a low-level graph (e.g., data loaded eagerly), keyed by the identity of the array owning their memory.
+    """
+    import numpy as np
+
+    try:
+        from dask._task_spec import GraphNode
+    except ImportError:
+        GraphNode = ()
+
+    if isinstance(node, np.ndarray):
+        # views (e.g., the chunks of an in-memory array) share the memory of their base
+        while isinstance(node.base, np.ndarray):
+            node = node.base
+        found[id(node)] = node.nbytes
+    elif isinstance(node, GraphNode):
+        for a in [
+            getattr(node, "value", None),
+            *getattr(node, "args", ()),
+            *getattr(node, "kwargs", {}).values(),
+        ]:
+            resident_arrays(a, found)
+    elif isinstance(node, (tuple, list)):
+        for a in node:
+            resident_arrays(a, found)
+    elif isinstance(node, dict):
+        for a in node.values():
+            resident_arrays(a, found)
+
+
+def estimate(obj: Any, workers: int | None = None) -> Dict[str, int]:
+    """
+    Estimate the cost of computing a lazy object by inspecting its task graph and the metadata of the datasets it reads.
+
+    Parameters
+    ----------
+    `obj` : `xr.DataArray | xr.Dataset | da.Array`
+        the lazy object
+    `workers` : `int`, optional
+        number of tasks running at once (default: the number of threads of the dask scheduler)
+
+    Returns
+    -------
+    `Dict[str, int]`
+        - `read_bytes`: bytes read from disk (whole chunks are read, even if only a part of them is selected)
+        - `result_bytes`: size of the computed object
+        - `resident_bytes`: size of the arrays already in memory the computation uses (e.g., data loaded eagerly)
+        - `peak_bytes`: rough estimate of the peak memory: the result (twice, when it is assembled from several chunks), the arrays already in memory, and the largest chunks read by the tasks running at once
+        - `files`: number of files read
+        - `tasks`: number of tasks to run
+    """
+    from dask.core import flatten
+    from dask.optimization import cull
+    import dask.config
+    import dask.system
+
+    if not hasattr(obj, "__dask_graph__") or obj.__dask_graph__() is None:
+        nbytes = int(getattr(obj, "nbytes", 0))
+        return {
+            "read_bytes": 0,
+            "result_bytes": nbytes,
+            "resident_bytes": nbytes,
+            "peak_bytes": nbytes,
+            "files": 0,
+            "tasks": 0,
+        }
+    if workers is None:
+        workers = dask.config.get("num_workers", None) or dask.system.CPU_COUNT
+
+    keys = list(flatten(obj.__dask_keys__()))
+    graph, _ = cull(dict(obj.__dask_graph__()), keys)
+    read_bytes, max_read, nreads, files = 0, 0, 0, set()
+    resident: Dict[int, int] = {}
+    for task in graph.values():
+        resident_arrays(task, resident)
+        cost = read_cost(task, graph)
+        if cost is not None:
+            read_bytes += cost[0]
+            max_read = max(max_read, cost[0])
+            nreads += 1
+            files.update(cost[1])
+
+    result_bytes = int(obj.nbytes)
+    resident_bytes = sum(resident.values())
+    return {
+        "read_bytes": int(read_bytes),
+        "result_bytes": result_bytes,
+        "resident_bytes": int(resident_bytes),
+        "peak_bytes": int(
+            (2 if len(keys) > 1 else 1) * result_bytes
+            + resident_bytes
+            + min(workers, nreads) * max_read
+        ),
+        "files": len(files),
+        "tasks": len(graph),
+    }
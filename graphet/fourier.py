@@ -0,0 +1,139 @@
+from typing import Any, Dict, List, Tuple
+import threading
+
+# bins of the modes of the slabs of the spectrum plans, kept by each process (worker) across the
+# steps it transforms, up to a total size
+INDEX_CACHE_BYTES = 512 * 1000**2
+_index_cache: Dict[tuple, Any] = {}
+_index_cache_lock = threading.Lock()
+_index_cache_nbytes = 0
+
+
+class SpectrumPlan:
+    def __init__(self, shape: Tuple[int, ...], spacing: Any, bins: Any = None):
+        """
+        Shell binning of the modes of a real FFT, shared by all the steps. Only the 1D wavenumbers along each axis are kept, so the plan stays small when embedded in the graph; the bins of the modes are computed slab by slab, the first time a process transforms a step, and kept by the process for the next steps (up to `INDEX_CACHE_BYTES` in total).
+
+        Parameters
+        ----------
+        `shape` : `Tuple[int, ...]`
+            the shape of the grid
+        `spacing` : `np.array`
+            the grid spacing along each axis
+        `bins` : `int | np.array`, optional
+            number of linearly spaced bins in `|k|` between 0 and the largest wavenumber, or the bin edges (default: `None`, bins as wide as the smallest wavenumber of the box)
+
+        Attributes
+        ----------
+        `edges`, `centers` : `np.array`
+            edges and centers of the `|k|` bins
+        `ks` : `List[np.array]`
+            wavenumbers along each axis (only the non-negative ones along the last axis)
+        `multiplicity` : `np.array`
+            multiplicity of the modes along the last axis of the real FFT (modes with negative last wavenumbers are implied)
+        """
+        import numpy as np
+
+        self.shape = tuple(shape)
+        self.ks = [
+            2 * np.pi * np.fft.fftfreq(n, d=d) for n, d in zip(shape[:-1], spacing[:-1])
+        ]
+        self.ks.append(2 * np.pi * np.fft.rfftfreq(shape[-1], d=spacing[-1]))
+        kmax = np.sqrt(sum(np.max(k**2) for k in self.ks))
+        if bins is None:
+            dk = min(2 * np.pi / (n * d) for n, d in zip(shape, spacing))
+            bins = np.arange(0, kmax + dk, dk)
+        elif np.ndim(bins) == 0:
+            bins = np.linspace(0, kmax, int(bins) + 1)
+        self.edges = np.asarray(bins, dtype=np.float64)
+        self.centers = 0.5 * (self.edges[1:] + self.edges[:-1])
+
+        self.key = (self.shape, tuple(map(float, spacing)), self.edges.tobytes())
+        self.multiplicity = np.full(len(self.ks[-1]), 2.0)
+        self.multiplicity[0] = 1.0
+        if shape[-1] % 2 == 0:
+            self.multiplicity[-1] = 1.0
+
+    def index(self, i: int) -> Any:
+        """
+        Bin of each mode of the `i`-th slab along the first axis (`-1` for the modes outside of the bins), cached by the process.
+        """
+        global _index_cache_nbytes
+
+        index = _index_cache.get((self.key, i))
+        if index is None:
+            index = self.computeIndex(i)
+            with _index_cache_lock:
+                # slabs past the budget are recomputed (evicting would miss on every slab)
+                if _index_cache_nbytes + index.nbytes <= INDEX_CACHE_BYTES:
+                    _index_cache[(self.key, i)] = index
+                    _index_cache_nbytes += index.nbytes
+        return index
+
+    def computeIndex(self, i: int) -> Any:
+        import numpy as np
+
+        ks = [self.ks[0][i : i + 1], *self.ks[1:]]
+        kmag = np.sqrt(sum(k**2 for k in np.meshgrid(*ks, indexing="ij", sparse=True)))
+        index = np.digitize(kmag, self.edges) - 1
+        # the last edge is inclusive
+        index[kmag == self.edges[-1]] = len(self.edges) - 2
+        index[(index < 0) | (index >= len(self.centers))] = -1
+        dtype = np.int16 if len(self.centers) < np.iinfo(np.int16).max else np.int32
+        return index[0].astype(dtype)
+
+    def __call__(self, *fields: Any) -> Any:
+        """
+        Shell-summed power spectrum of the sum of the squares of the given fields, normalized such that its sum over all the bins equals the mean of the squared fields over the grid.
+        """
+        import numpy as np
+
+        if not fields:
+            raise ValueError("At least one field is required for a power spectrum")
+        power = None
+        for f in fields:
+            p = np.abs(np.fft.rfftn(np.asarray(f, dtype=np.float64))) ** 2
+            power = p if power is None else power + p
+        power *= self.multiplicity / float(np.prod(self.shape)) ** 2
+        spectrum = np.zeros(len(self.centers))
+        for i in range(len(self.ks[0])):
+            index = self.index(i)
+            inside = index >= 0
+            spectrum += np.bincount(
+                index[inside], weights=power[i][inside], minlength=len(self.centers)
+            )
+        return spectrum
+
+
+def power_spectra(steps: List[List[Any]], plan: SpectrumPlan) -> Any:
+    """
+    Lazily compute power spectra at each step, one task per step.
+
+    Parameters
+    ----------
+    `steps` : `List[List[da.Array]]`
+        the fields at each step
+    `plan` : `SpectrumPlan`
+        the FFT binning plan
+
+    Returns
+    -------
+    `da.Array`
+        the spectra, with shape `(len(steps), len(plan.centers))`
+    """
+    from dask.array.core import from_delayed as da_from_delayed, stack as da_stack
+    from dask.delayed import delayed
+    import numpy as np
+
+    shared_plan = delayed(plan, pure=True)
+    return da_stack(
+        [
+            da_from_delayed(
+                shared_plan(*[f.rechunk(-1) for f in fields]),
+                shape=(len(plan.centers),),
+                dtype=np.float64,
+            )
+            for fields in steps
+        ],
+        axis=0,
+    )
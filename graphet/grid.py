@@ -0,0 +1,308 @@
+from typing import Any, Dict, List, Tuple
+
+SHAPES = ["NGP", "CIC"]
+
+
+def grid_geometry(coords: List[Any]) -> Tuple[Any, Any, Tuple[int, ...]]:
+    """
+    Origin, spacing and shape of a uniform grid given its coordinates along each axis.
+
+    Parameters
+    ----------
+    `coords` : `List[np.array]`
+        the 1D coordinates of the grid nodes along each axis
+
+    Returns
+    -------
+    `Tuple[np.array, np.array, Tuple[int, ...]]`
+        the origin, the spacing, and the number of nodes along each axis
+    """
+    import numpy as np
+
+    origin = np.array([float(c[0]) for c in coords])
+    spacing = np.array(
+        [
+            (float(c[-1]) - float(c[0])) / (len(c) - 1) if len(c) > 1 else 1.0
+            for c in coords
+        ]
+    )
+    return origin, spacing, tuple(len(c) for c in coords)
+
+
+def stencil(
+    positions: List[Any], origin: Any, spacing: Any, shape: str
+) -> List[Tuple[List[Any], Any]]:
+    """
+    Nodes and weights of the particle shape function.
+
+    Parameters
+    ----------
+    `positions` : `List[np.array]`
+        the particle positions along each axis
+    `origin`, `spacing` : `np.array`
+        the grid geometry (see `grid_geometry`)
+    `shape` : `str`
+        `"NGP"` (nearest grid point) or `"CIC"` (cloud in cell, i.e., linear)
+
+    Returns
+    -------
+    `List[Tuple[List[np.array], np.array]]`
+        for each of the `1` (NGP) or `2^D` (CIC) stencil nodes, the node indices along each axis and the weights
+    """
+    import itertools
+    import numpy as np
+
+    scaled = [(p - o) / d for p, o, d in zip(positions, origin, spacing)]
+    if shape == "NGP":
+        return [([np.rint(s).astype(np.int64) for s in scaled], 1.0)]
+    elif shape == "CIC":
+        lower = [np.floor(s).astype(np.int64) for s in scaled]
+        frac = [s - l for s, l in zip(scaled, lower)]
+        nodes = []
+        for corner in itertools.product((0, 1), repeat=len(scaled)):
+            weight = 1.0
+            for c, f in zip(corner, frac):
+                weight = weight * (f if c else 1.0 - f)
+            nodes.append(([l + c for l, c in zip(lower, corner)], weight))
+        return nodes
+    else:
+        raise ValueError(f"Unknown shape `{shape}`, must be one of {SHAPES}")
+
+
+def deposit(
+    positions: List[Any],
+    weights: Any,
+    mask: Any,
+    geometry: Tuple[Any, Any, Tuple[int, ...]],
+    shape: str,
+) -> Any:
+    """
+    Deposit particles onto a uniform grid. Particles with non-finite positions or weights, or outside of the grid, are ignored.
+
+    Parameters
+    ----------
+    `positions` : `List[np.array]`
+        the particle positions along each axis of the grid
+    `weights` : `np.array | float`
+        the particle weights
+    `mask` : `np.array | None`
+        which particles to deposit (default: all)
+    `geometry` : `Tuple[np.array, np.array, Tuple[int, ...]]`
+        the grid geometry (see `grid_geometry`)
+    `shape` : `str`
+        the particle shape function, `"NGP"` or `"CIC"`
+
+    Returns
+    -------
+    `np.array`
+        the deposited moment on the grid
+    """
+    import numpy as np
+
+    origin, spacing, dims = geometry
+    positions = [np.asarray(p, dtype=np.float64) for p in positions]
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), positions[0].shape)
+    keep = np.isfinite(weights)
+    for p in positions:
+        keep &= np.isfinite(p)
+    if mask is not None:
+        keep &= np.asarray(mask, dtype=bool)
+    positions = [p[keep] for p in positions]
+    weights = weights[keep]
+
+    grid = np.zeros(int(np.prod(dims)), dtype=np.float64)
+    for nodes, w in stencil(positions, origin, spacing, shape):
+        inside = np.ones(len(weights), dtype=bool)
+        for n, size in zip(nodes, dims):
+            inside &= (n >= 0) & (n < size)
+        flat = np.ravel_multi_index([n[inside] for n in nodes], dims)
+        grid += np.bincount(
+            flat,
+            weights=(weights * w)[inside] if np.ndim(w) else weights[inside] * w,
+            minlength=len(grid),
+        )
+    return grid.reshape(dims)
+
+
+def expression(ds: Any, expr: Any) -> Any:
+    """
+    Evaluate a particle expression: `None`, a key of the dataset, or a function of the dataset.
+    """
+    if expr is None or not (isinstance(expr, str) or callable(expr)):
+        return expr
+    return ds[expr] if isinstance(expr, str) else expr(ds)
+
+
+def particle_blocks(arrays: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Split 1D particle arrays (along `idx`) into delayed blocks with common boundaries. The in-memory arrays of the same length as the lazy ones (e.g., masks built from the `idx` coordinate) are split along the same boundaries; scalars are passed to every block as they are.
+    """
+    import dask.array as da
+    import numpy as np
+
+    lazy = [a for a in arrays.values() if isinstance(a, da.Array)]
+    if not lazy:
+        return [arrays]
+    chunks = lazy[0].chunks
+    keys = [
+        k
+        for k, a in arrays.items()
+        if isinstance(a, da.Array) or (np.ndim(a) == 1 and len(a) == lazy[0].shape[0])
+    ]
+    delayed = {
+        k: (
+            arrays[k].rechunk(chunks)
+            if isinstance(arrays[k], da.Array)
+            else da.from_array(np.asarray(arrays[k]), chunks=chunks)
+        )
+        .to_delayed()
+        .ravel()
+        for k in keys
+    }
+    return [
+        {k: (delayed[k][i] if k in delayed else a) for k, a in arrays.items()}
+        for i in range(len(chunks[0]))
+    ]
+
+
+def clamp_positions(
+    positions: List[Any], geometry: Tuple[Any, Any, Tuple[int, ...]]
+) -> List[Any]:
+    """
+    Clamp the particle positions within one cell of the edges of the grid to its outermost nodes (e.g., in the last cell of a periodic box); the positions farther out become `NaN`.
+    """
+    import numpy as np
+
+    origin, spacing, dims = geometry
+    clamped = []
+    for p, o, d, n in zip(positions, origin, spacing, dims):
+        p = np.asarray(p, dtype=np.float64)
+        scaled = (p - o) / d
+        clamped.append(
+            np.where(
+                (scaled > -1) & (scaled < n), np.clip(p, o, o + (n - 1) * d), np.nan
+            )
+        )
+    return clamped
+
+
+def chunk_buckets(
+    positions: List[Any],
+    geometry: Tuple[Any, Any, Tuple[int, ...]],
+    chunks: Tuple[Tuple[int, ...], ...],
+    shape: str,
+) -> Dict[Tuple[int, ...], Any]:
+    """
+    Bucket particles by the chunks of a field holding the nodes of their shape function. A particle near the boundary between chunks lands in the buckets of all of them. Particles with non-finite positions, or outside of the grid (see `clamp_positions`), are left out.
+
+    Parameters
+    ----------
+    `positions` : `List[np.array]`
+        the particle positions along each axis of the grid
+    `geometry` : `Tuple[np.array, np.array, Tuple[int, ...]]`
+        the grid geometry (see `grid_geometry`)
+    `chunks` : `Tuple[Tuple[int, ...], ...]`
+        the chunk sizes of the field along each axis
+    `shape` : `str`
+        the particle shape function, `"NGP"` or `"CIC"`
+
+    Returns
+    -------
+    `Dict[Tuple[int, ...], np.array]`
+        the (sorted) indices of the particles touching each chunk
+    """
+    import numpy as np
+
+    origin, spacing, dims = geometry
+    positions = clamp_positions(positions, geometry)
+    finite = np.ones(len(positions[0]), dtype=bool)
+    for p in positions:
+        finite &= np.isfinite(p)
+    index = np.nonzero(finite)[0]
+    nprtls = len(positions[0])
+    starts = [np.cumsum((0,) + tuple(c)) for c in chunks]
+    nchunks = tuple(len(c) for c in chunks)
+
+    pairs = [np.zeros(0, dtype=np.int64)]
+    for nodes, _ in stencil([p[index] for p in positions], origin, spacing, shape):
+        inside = np.ones(len(index), dtype=bool)
+        for n, size in zip(nodes, dims):
+            inside &= (n >= 0) & (n < size)
+        chunk = np.ravel_multi_index(
+            [
+                np.searchsorted(s, n[inside], side="right") - 1
+                for s, n in zip(starts, nodes)
+            ],
+            nchunks,
+        )
+        pairs.append(chunk * nprtls + index[inside])
+    chunk, prtl = np.divmod(np.unique(np.concatenate(pairs)), nprtls)
+    ids, first = np.unique(chunk, return_index=True)
+    return {
+        tuple(int(i) for i in np.unravel_index(c, nchunks)): prtl[start:end]
+        for c, start, end in zip(ids, first, list(first[1:]) + [len(prtl)])
+    }
+
+
+def gather_chunk(
+    block: Any,
+    start: Tuple[int, ...],
+    positions: List[Any],
+    index: Any,
+    geometry: Tuple[Any, Any, Tuple[int, ...]],
+    shape: str,
+) -> Tuple[Any, Any, Any]:
+    """
+    Interpolate a chunk of a field at the positions of the particles touching it.
+
+    Parameters
+    ----------
+    `block` : `np.array`
+        the chunk of the field
+    `start` : `Tuple[int, ...]`
+        the index of the first node of the chunk along each axis
+    `positions` : `List[np.array]`
+        the positions of all the particles along each axis of the grid
+    `index` : `np.array`
+        the indices of the particles touching the chunk (see `chunk_buckets`)
+    `geometry` : `Tuple[np.array, np.array, Tuple[int, ...]]`
+        the grid geometry (see `grid_geometry`)
+    `shape` : `str`
+        the particle shape function, `"NGP"` or `"CIC"`
+
+    Returns
+    -------
+    `Tuple[np.array, np.array, np.array]`
+        the indices of the particles, and the weighted sums of the field values and the weights of the nodes within the chunk
+    """
+    import numpy as np
+
+    origin, spacing, _ = geometry
+    block = np.asarray(block)
+    positions = clamp_positions([np.asarray(p)[index] for p in positions], geometry)
+    values = np.zeros(len(index), dtype=np.float64)
+    weights = np.zeros(len(index), dtype=np.float64)
+    for nodes, w in stencil(positions, origin, spacing, shape):
+        local = [n - s for n, s in zip(nodes, start)]
+        inside = np.ones(len(index), dtype=bool)
+        for l, size in zip(local, block.shape):
+            inside &= (l >= 0) & (l < size)
+        w = np.broadcast_to(w, values.shape)[inside]
+        values[inside] += block[tuple(l[inside] for l in local)] * w
+        weights[inside] += w
+    return index, values, weights
+
+
+def assemble(nprtls: int, *parts: Tuple[Any, Any, Any]) -> Any:
+    """
+    Combine the partial interpolations of the chunks of a field (see `gather_chunk`) into the values at all the particles (`NaN` for the particles left out).
+    """
+    import numpy as np
+
+    values = np.zeros(nprtls, dtype=np.float64)
+    weights = np.zeros(nprtls, dtype=np.float64)
+    for index, v, w in parts:
+        values[index] += v
+        weights[index] += w
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(weights > 0, values / weights, np.nan)
@@ -1,18 +1,40 @@
-from typing import Any, List, Dict, Union, Callable
+from typing import Any, List, Dict, Tuple, Union, Callable
 from .utils import array_t
 
 
+class GroupReader:
+    def __init__(self, datasets: Dict[str, Any]):
+        """
+        Task reading the same region of several datasets at once.
+
+        Parameters
+        ----------
+        `datasets` : `Dict[str, Any]`
+            the array-like datasets (of the same shape)
+        """
+        self.datasets = datasets
+
+    def __call__(self, sel: tuple) -> Dict[str, Any]:
+        from numpy import asarray as np_asarray
+
+        return {k: np_asarray(ds[sel]) for k, ds in self.datasets.items()}
+
+
 class Plugin:
 
     def __init__(
         self,
         params: bool = False,
         fields: None | List[str] = ["ALL"],
-        particles: None | List[str] = ["ALL"],
+        particles: None | List[str | int] = ["ALL"],
         spectra: None | List[str] = ["ALL"],
         coord_transform: None | Dict[str, Callable[[array_t, Any], array_t]] = None,
         origaxes: str = "zyx",
         swapaxes: Union[List[List[int]], None] = None,
+        dtypes: None | str | Dict[str, str] = None,
+        precision_rtol: float = 1e-6,
+        engine: str = "h5py",
+        shm_cache: None | str = None,
     ):
         """
         Plugin base class contains all the information required to properly read the date from a simulation, but does not actually carry the data itself. Child classes must implement the following virtual methods:
@@ -30,22 +52,32 @@ class Plugin:
         - `openParticleFiles`
         - `openSpectrumFiles`
 
+        and may override `sourceFiles` to report the files the data is read from. Files opened with `open_h5(fname, self.handles)` belong to the plugin: they stay open while the plugin (or data read from them) is alive, and are closed by `close`.
+
         Parameters
         ----------
         `params` : `bool`, optional
             whether to read the simulation parameters (default: `False`)
         `fields` : `Union[None, List[str]]`, optional
-            list of fields to read (default: `["ALL"]`)
-        `particles` : `Union[None, List[str]]`, optional
-            list of particle species to read (default: `["ALL"]`)
+            list of fields to read, as names or glob patterns, e.g., `["b*", "dens[12]"]` (default: `["ALL"]`)
+        `particles` : `Union[None, List[str | int]]`, optional
+            list of particle species (integers) and particle keys (names or glob patterns) to read, e.g., `[1, 2, "x", "u*"]`; all the species/keys are read if none are given (default: `["ALL"]`)
         `spectra` : `Union[None, List[str]]`, optional
-            list of spectra to read (default: `["ALL"]`)
+            list of spectra to read, as names or glob patterns (default: `["ALL"]`)
         `coord_transform` : `Union[None, Dict[str, Callable[[np_Array, Any], np_Array]]]`, optional
             dictionary of coordinate transformations to apply to the coordinates read from the simulation. The keys are the axes to transform, and the values are the transformation functions. The transformation functions take two arguments: the coordinate array and the simulation parameters. (default: `None`)
         `origaxes` : `str`, optional
             the original axis order of the simulation (default: `"zyx"`)
         `swapaxes` : `Union[List[List[int]], None]`, optional
             list of pairs of axes to swap (default: `None`)
+        `dtypes` : `Union[None, str, Dict[str, str]]`, optional
+            dtypes to convert the fields and particle keys to while reading them. A single dtype (e.g., `"float32"`) applies to all floating point data; a dictionary maps field/particle keys (or glob patterns, e.g., `"u*"`, `"*"`) to dtypes, with the first matching entry used; glob patterns only apply to floating point data, other data (e.g., the integer `ind`/`proc`) is only converted when its key is named explicitly. (default: `None`, keep the dtypes from the files)
+        `precision_rtol` : `float`, optional
+            warn if converting a key to its new dtype introduces relative errors above this value in a sample of the data (default: `1e-6`)
+        `engine` : `str`, optional
+            how to read the fields and particle keys: `"h5py"` reads through h5py, `"direct"` reads the raw compressed chunks of gzip-compressed datasets and decompresses them in a thread pool, outside of the h5py lock (default: `"h5py"`)
+        `shm_cache` : `Union[None, str]`, optional
+            address of a running shared-memory chunk cache service (see `graphet.shmcache`), e.g., `"127.0.0.1:5577"`; the chunks of fields and particle keys are then looked up there before being read, and stored there after (default: `None`)
         """
         self.params = params
         self.fields = fields
@@ -54,8 +86,21 @@ class Plugin:
         self.origaxes = origaxes
         self.coord_transform = coord_transform
         self.swapaxes = swapaxes
+        self.dtypes = dtypes
+        self.precision_rtol = precision_rtol
+        if engine not in ("h5py", "direct"):
+            raise ValueError(f"Unknown engine `{engine}`")
+        self.engine = engine
+        if shm_cache is not None:
+            from .shmcache import SharedCacheClient
+
+            self.shm_cache = SharedCacheClient(shm_cache)
+        else:
+            self.shm_cache = None
+        self._checked_dtypes = set()
         self.axes = list(self.origaxes)
         self._has_prtl_idx = None
+        self.handles: Dict[str, Any] = {}
         if self.swapaxes is not None:
             for s in self.swapaxes:
                 self.axes[s[0]], self.axes[s[1]] = (
@@ -64,6 +109,175 @@ class Plugin:
                 )
         self.axes = "".join(self.axes)
 
+    @staticmethod
+    def matchKeys(
+        keys: List[Any], patterns: None | List[Any], strict: bool = True
+    ) -> List[Any]:
+        """
+        Select the keys matching any of the patterns (names or glob patterns), keeping their order. `"ALL"` (or no patterns at all) selects every key.
+
+        Parameters
+        ----------
+        `keys` : `List[Any]`
+            the available keys
+        `patterns` : `None | List[Any]`
+            the names/patterns to select
+        `strict` : `bool`, optional
+            whether to raise an error for explicitly named keys which are not available (default: `True`)
+
+        Returns
+        -------
+        `List[Any]`
+            the selected keys
+
+        Raises
+        ------
+        `ValueError`
+            if an explicitly named key (not a glob pattern) is not available and `strict` is set
+        """
+        from fnmatch import fnmatchcase
+
+        if not patterns or "ALL" in patterns:
+            return list(keys)
+        for p in patterns if strict else []:
+            if not any(c in str(p) for c in "*?[") and str(p) not in map(str, keys):
+                raise ValueError(f"`{p}` not found, available: {list(keys)}")
+        return [k for k in keys if any(fnmatchcase(str(k), str(p)) for p in patterns)]
+
+    def asDask(self, arr: Any, key: str | None = None) -> array_t:
+        """
+        Wrap an array-like object read from the simulation (e.g., an HDF5 dataset) into a dask array, unless it already is one.
+
+        Parameters
+        ----------
+        `arr` : `Any`
+            the array-like object
+        `key` : `str`, optional
+            the name of the field/particle key, to apply the dtype policy for (default: `None`)
+
+        Returns
+        -------
+        `da.Array`
+            the dask array
+        """
+        from dask.array.core import Array as da_Array, from_array as da_from_array
+
+        if key is not None:
+            arr = self.cast(arr, key)
+        if isinstance(arr, da_Array):
+            return arr
+        return da_from_array(arr, chunks="auto")
+
+    def castDtype(self, key: str, dtype: Any) -> Any:
+        """
+        Resolve the dtype a key should be converted to according to the `dtypes` policy.
+
+        Parameters
+        ----------
+        `key` : `str`
+            the name of the field/particle key
+        `dtype` : `np.dtype`
+            the dtype of the data in the file
+
+        Returns
+        -------
+        `np.dtype | None`
+            the new dtype (or `None` if the data is kept as is)
+        """
+        from fnmatch import fnmatchcase
+        import numpy as np
+
+        dtype = np.dtype(dtype)
+        new = None
+        if isinstance(self.dtypes, str):
+            if np.issubdtype(dtype, np.floating):
+                new = np.dtype(self.dtypes)
+        elif self.dtypes is not None:
+            for pattern, dt in self.dtypes.items():
+                # patterns only convert floating point data (integer IDs would lose their
+                # exact values); other data is converted when its key is named explicitly
+                if fnmatchcase(key, pattern) and (
+                    pattern == key or np.issubdtype(dtype, np.floating)
+                ):
+                    new = np.dtype(dt)
+                    break
+        return None if new is None or new == dtype else new
+
+    def cast(self, arr: Any, key: str) -> Any:
+        """
+        Apply the read engine, the dtype policy and the shared-memory cache to an array-like object read from the simulation. HDF5 datasets are converted while being read (chunk by chunk), dask arrays within each of their chunks.
+
+        Parameters
+        ----------
+        `arr` : `Any`
+            the array-like object
+        `key` : `str`
+            the name of the field/particle key
+
+        Returns
+        -------
+        `Any`
+            the array-like object with the new dtype
+        """
+        from dask.array.core import Array as da_Array
+        from h5py import Dataset as h5_Ds
+        from .utils import CastDataset, DirectChunkDataset
+
+        dtype = self.castDtype(key, arr.dtype)
+        if dtype is not None and key not in self._checked_dtypes:
+            self._checked_dtypes.add(key)
+            self.checkPrecision(key, arr, dtype)
+        if isinstance(arr, da_Array):
+            return arr if dtype is None else arr.astype(dtype)
+        if (
+            self.engine == "direct"
+            and isinstance(arr, h5_Ds)
+            and DirectChunkDataset.supports(arr)
+        ):
+            arr = DirectChunkDataset(arr, dtype)
+        elif dtype is not None:
+            arr = CastDataset(arr, dtype)
+        if self.shm_cache is not None:
+            from .shmcache import SharedCachedDataset
+
+            arr = SharedCachedDataset(arr, self.shm_cache)
+        return arr
+
+    def checkPrecision(self, key: str, arr: Any, dtype: Any) -> None:
+        """
+        Warn if converting a key to a new dtype loses significant precision, based on a sample of the data (at most 64 elements along each axis).
+
+        Parameters
+        ----------
+        `key` : `str`
+            the name of the field/particle key
+        `arr` : `Any`
+            the array-like object
+        `dtype` : `np.dtype`
+            the new dtype
+        """
+        import warnings
+        import numpy as np
+
+        if arr.size == 0:
+            return
+        sample = np.asarray(arr[tuple(slice(0, 64) for _ in arr.shape)])
+        with np.errstate(all="ignore"):
+            cast = sample.astype(dtype).astype(sample.dtype)
+            if np.issubdtype(sample.dtype, np.floating):
+                nonzero = sample != 0
+                error = np.abs(cast[nonzero] - sample[nonzero]) / np.abs(
+                    sample[nonzero]
+                )
+                error = np.nanmax(error, initial=0.0)
+            else:
+                error = 0.0 if np.array_equal(cast, sample) else np.inf
+        if not error <= self.precision_rtol:
+            warnings.warn(
+                f"Converting `{key}` from {sample.dtype} to {np.dtype(dtype)} "
+                f"introduces relative errors up to {error:.3g}"
+            )
+
     def coords(self) -> Dict[str, array_t]:
         """
         Read the coordinates from the simulation and apply any coordinate transformations.
@@ -97,12 +311,90 @@ class Plugin:
         `da.Array`
             the field as a dask array
         """
-        from dask.array.core import from_array as da_from_array
-        from dask.array.routines import swapaxes as da_swapaxes
+        oldfield, transform = self.fieldSource(field)
+        arr = self.asDask(self.readField(oldfield, step), field)
+        return self.orientField(arr, transform)
+
+    def fieldGroup(self, fields: List[str], step: int) -> Dict[str, array_t]:
+        """
+        Read several fields from the simulation at a specific step as dask arrays sharing their read tasks: each chunk region of the step file is read by a single task loading all the fields, while the file is open. Useful when the fields are always used together (reading any one of them reads all of them).
+
+        Parameters
+        ----------
+        `fields` : `List[str]`
+            the names of the fields to read
+        `step` : `int`
+            the step to read
+
+        Returns
+        -------
+        `Dict[str, da.Array]`
+            the fields as dask arrays
+        """
+        from dask.array.core import Array as da_Array, normalize_chunks
+        from dask.highlevelgraph import HighLevelGraph
+        from dask.base import tokenize
+        from operator import getitem
+        import itertools
+        import numpy as np
+
+        sources = {f: self.fieldSource(f) for f in fields}
+        datasets = {
+            f: self.cast(self.readField(src, step), f)
+            for f, (src, _) in sources.items()
+        }
+        shapes = {ds.shape for ds in datasets.values()}
+        if len(shapes) != 1 or any(
+            isinstance(ds, da_Array) for ds in datasets.values()
+        ):
+            # stitched or mismatching datasets are read key by key
+            return {f: self.field(f, step) for f in fields}
+
+        first = next(iter(datasets.values()))
+        chunks = normalize_chunks(
+            "auto",
+            first.shape,
+            dtype=max((ds.dtype for ds in datasets.values()), key=lambda d: d.itemsize),
+            previous_chunks=first.chunks,
+        )
+        reader = GroupReader(datasets)
+        name = "read-group-" + tokenize(list(datasets.items()), chunks)
+        offsets = [np.cumsum((0,) + c) for c in chunks]
+        group_layer = {
+            (name, *idx): (
+                reader,
+                tuple(slice(o[i], o[i + 1]) for o, i in zip(offsets, idx)),
+            )
+            for idx in itertools.product(*(range(len(c)) for c in chunks))
+        }
+        arrays = {}
+        for f, ds in datasets.items():
+            fname = f"{f}-{name}"
+            layer = {(fname, *key[1:]): (getitem, key, f) for key in group_layer.keys()}
+            graph = HighLevelGraph(
+                {name: group_layer, fname: layer}, {name: set(), fname: {name}}
+            )
+            arrays[f] = self.orientField(
+                da_Array(graph, fname, chunks, dtype=ds.dtype), sources[f][1]
+            )
+        return arrays
+
+    def fieldSource(self, field: str) -> Tuple[str, Callable | None]:
+        """
+        Map the name of a field to its name in the simulation output (undoing the axes swapping), and find the coordinate transformation to apply to it (for the coordinate fields, e.g., `xx`).
+
+        Parameters
+        ----------
+        `field` : `str`
+            the name of the field
 
+        Returns
+        -------
+        `Tuple[str, Callable | None]`
+            the name of the field in the output, and the transformation (or `None`)
+        """
         oldfield = field + ""
         ax_mapping = {newax: oldax for oldax, newax in zip(self.origaxes, self.axes)}
-        params = self.readParams()
 
         transform: None | Callable = None
 
@@ -116,14 +408,32 @@ class Plugin:
                     transform = self.coord_transform[xyz]
             else:
                 oldfield = oldfield[:-1] + ax_mapping[oldfield[-1]]
+        return oldfield, transform
+
+    def orientField(self, arr: array_t, transform: Callable | None = None) -> array_t:
+        """
+        Swap the axes of a field read from the simulation, and apply its coordinate transformation.
+
+        Parameters
+        ----------
+        `arr` : `da.Array`
+            the field as stored in the output
+        `transform` : `Callable`, optional
+            the coordinate transformation (default: `None`)
+
+        Returns
+        -------
+        `da.Array`
+            the field
+        """
+        from dask.array.routines import swapaxes as da_swapaxes
 
-        arr = da_from_array(self.readField(oldfield, step), chunks="auto")
         if self.swapaxes is not None:
             for sw in self.swapaxes:
                 arr = da_swapaxes(arr, *sw)
 
         if transform is not None:
-            return transform(arr, params)
+            return transform(arr, self.readParams())
         else:
             return arr
 
@@ -145,9 +455,8 @@ class Plugin:
         `da.Array`
             the particle key as a dask array
         """
-        from dask.array.core import from_array as da_from_array
         from xarray import DataArray as xr_DataArray
-        from numpy import array as np_array
+        from numpy import array as np_array, asarray as np_asarray
 
         oldkey = key + ""
         ax_mapping = {newax: oldax for oldax, newax in zip(self.origaxes, self.axes)}
@@ -158,7 +467,7 @@ class Plugin:
         if oldkey in ["x", "y", "z"]:
             oldkey = ax_mapping[oldkey]
             if (self.coord_transform is not None) and (
-                oldkey in self.coord_transform.keys()
+                key in self.coord_transform.keys()
             ):
                 transform = self.coord_transform[key]
 
@@ -175,13 +484,13 @@ class Plugin:
 
             self._has_prtl_idx = True
             da = xr_DataArray(
-                self.readParticleKey(sp, oldkey, step),
+                np_asarray(self.cast(self.readParticleKey(sp, oldkey, step), key)),
                 coords={"idx": idx, "t": t},
                 dims="idx",
             )
         else:
             self._has_prtl_idx = False
-            da = da_from_array(self.readParticleKey(sp, oldkey, step), chunks="auto")
+            da = self.asDask(self.readParticleKey(sp, oldkey, step), key)
 
         if transform is not None:
             return transform(
@@ -204,14 +513,14 @@ class Plugin:
 
         Returns
         -------
-        `da.Array | None`
-            the particle index as a dask array (or none if indexing is not available)
+        `np.array | da.Array | None`
+            the particle index (or none if indexing is not available)
         """
         return None
 
     def spectrum(self, spec: str, step: int) -> array_t:
         """
-        Read a spectrum from the simulation at a specific step and return it as a dask array.
+        Read a spectrum from the simulation at a specific step and return it as a dask array. Spatially binned spectra keep their spatial dimensions (see `specBins`), chunked along them only, so selecting a region reads only its bins.
 
         Parameters
         ----------
@@ -226,11 +535,64 @@ class Plugin:
             the spectrum as a dask array
         """
         from dask.array.core import from_array as da_from_array
+
+        ds = self.readSpectrum(spec, step)
+        binned = [i for i, n in enumerate(ds.shape) if n > 1]
+        chunks = tuple(
+            -1 if binned and i == binned[0] else "auto" if n > 1 else 1
+            for i, n in enumerate(ds.shape)
+        )
+        return self.shapeSpectrum(spec, da_from_array(ds, chunks=chunks))
+
+    def shapeSpectrum(self, spec: str, arr: Any) -> Any:
+        """
+        Drop the singleton axes of a spectrum as stored in the output, and sum it over the trailing axes which have no bins (see `specBins`).
+
+        Parameters
+        ----------
+        `spec` : `str`
+            the name of the spectrum
+        `arr` : `np.array | da.Array`
+            the spectrum as stored
+
+        Returns
+        -------
+        `np.array | da.Array`
+            the spectrum with one axis per bin
+        """
+        arr = arr[tuple(0 if n == 1 else slice(None) for n in arr.shape)]
+        unbinned = arr.ndim - len(self.specBins(spec))
+        if unbinned > 0:
+            arr = arr.sum(axis=tuple(range(arr.ndim - unbinned, arr.ndim)))
+        return arr
+
+    def spectrumStack(self, spec: str, steps: List[int]) -> array_t:
+        """
+        Read a spectrum at all the given steps into a single in-memory array. The steps are read concurrently. Meant for small datasets, for which the scheduling overhead of per-step dask arrays exceeds the cost of reading them.
+
+        Parameters
+        ----------
+        `spec` : `str`
+            the name of the spectrum to read
+        `steps` : `List[int]`
+            the steps to read
+
+        Returns
+        -------
+        `np.array`
+            the spectra stacked along the first axis
+        """
+        from concurrent.futures import ThreadPoolExecutor
         import numpy as np
 
-        arr = self.readSpectrum(spec, step)
-        arr = da_from_array(np.squeeze(arr), chunks="auto")
-        return arr.reshape(arr.shape[0], -1).sum(axis=1)
+        def read(step: int):
+            return self.shapeSpectrum(
+                spec, np.asarray(self.readSpectrum(spec, step)[()])
+            )
+
+        self.openSpectrumFiles(steps)
+        with ThreadPoolExecutor() as executor:
+            return np.stack(list(executor.map(read, steps)))
 
     def readParams(self) -> Any:
         """
@@ -369,7 +731,7 @@ class Plugin:
         Returns
         -------
         `Dict[str, np_Array]`
-            the bins for the spectrum
+            the bins for the spectrum, one per axis of the spectrum (after dropping its singleton axes) in the same order, e.g., the energy bins followed by the spatial bins
 
         Raises
         ------
@@ -478,6 +840,47 @@ class Plugin:
         """
         raise NotImplementedError("openSpectrumFiles not implemented")
 
+    def availableSteps(self) -> List[int]:
+        """
+        Find the steps present in the simulation output.
+
+        Returns
+        -------
+        `List[int]`
+            the sorted list of steps
+
+        Raises
+        ------
+        `NotImplementedError`
+            if not implemented in the child class
+        """
+        raise NotImplementedError("availableSteps not implemented")
+
+    def close(self) -> None:
+        """
+        Close all the files opened by the plugin. Data read lazily from them can no longer be computed.
+        """
+        from .utils import close_h5
+
+        for fname in list(self.handles.keys()):
+            close_h5(fname, self.handles)
+
+    def sourceFiles(self, steps: List[int]) -> List[str]:
+        """
+        Get the paths of all the files the data for the given steps is read from.
+
+        Parameters
+        ----------
+        `steps` : `List[int]`
+            the steps
+
+        Returns
+        -------
+        `List[str]`
+            the list of file paths (empty if the plugin does not report its files)
+        """
+        return []
+
     @property
     def has_particle_idx(self) -> bool:
         """
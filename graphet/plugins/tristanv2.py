@@ -1,14 +1,18 @@
 from typing import Dict, Any, List
 from ..plugin import Plugin
-from ..utils import array_t
+from ..utils import array_t, open_h5
 from h5py import Dataset as h5_Ds, File as h5_File
 
+# particle IDs are packed as `ind * PRTL_INDEX_BASE + proc`
+PRTL_INDEX_BASE = 100000000
+
 
 class TristanV2(Plugin):
     def __init__(
         self,
         path: str = "",
         cfg_fname: str | None = None,
+        index_cache: str | None = None,
         **kwargs,
     ):
         self.first_step = kwargs.get("first_step", kwargs.get("steps", [0])[0])
@@ -20,6 +24,10 @@ class TristanV2(Plugin):
             "coord_transform",
             "origaxes",
             "swapaxes",
+            "dtypes",
+            "precision_rtol",
+            "engine",
+            "shm_cache",
         ]
         super().__init__(**{k: v for k, v in kwargs.items() if k in parent_kwargs})
         self.path = path
@@ -33,6 +41,10 @@ class TristanV2(Plugin):
             "prtl": "prtl/prtl.tot.%05d",
             "spec": "spec/spec.tot.%05d",
         }
+        self._pieces: Dict[tuple, List[str]] = {}
+        self.index_cache = index_cache
+        self._prtl_index: Dict[tuple, Any] = {}
+        self._spec_bins: Dict[str, Dict[str, array_t]] = {}
 
         self.kwargs = {k: v for k, v in kwargs.items() if k not in parent_kwargs}
         self.files: Dict[str, Dict[int, h5_File] | None] = {
@@ -42,6 +54,8 @@ class TristanV2(Plugin):
         }
 
     def readCoords(self) -> Dict[str, array_t]:
+        import numpy as np
+
         if self.fields is None:
             return {
                 "x": self.kwargs.get("x"),
@@ -56,9 +70,9 @@ class TristanV2(Plugin):
                 self.readField("zz", s0),
             )
             return {
-                "x": xx[:][0, 0, :],
-                "y": yy[:][0, :, 0],
-                "z": zz[:][:, 0, 0],
+                "x": np.asarray(xx[0, 0, :]),
+                "y": np.asarray(yy[0, :, 0]),
+                "z": np.asarray(zz[:, 0, 0]),
             }
 
     def readParams(self) -> Dict[str, Any] | None:
@@ -89,9 +103,12 @@ class TristanV2(Plugin):
         else:
             return None
 
-    def readField(self, field: str, step: int) -> h5_Ds:
+    def readField(self, field: str, step: int) -> h5_Ds | array_t:
         if self.fields is None:
             raise ValueError("`fields` cannot be None when calling `readField`")
+        if self.isSplit("flds", step):
+            # every piece holds a slab of the whole box
+            return self.stitch(self.readPieces("flds", field, step, every=True))
         if (self.files["flds"] is None) or (step not in self.files["flds"].keys()):
             self.openFieldFiles([step])
         assert self.files["flds"] is not None, "Field files not opened"
@@ -99,11 +116,13 @@ class TristanV2(Plugin):
         assert isinstance(ds, h5_Ds), f"Field {field} not found in step {step}"
         return ds
 
-    def readParticleKey(self, species: int, key: str, step: int) -> h5_Ds:
+    def readParticleKey(self, species: int, key: str, step: int) -> h5_Ds | array_t:
         if self.particles is None:
             raise ValueError(
                 "`particles` cannot be None when calling `readParticleKey`"
             )
+        if self.isSplit("prtl", step):
+            return self.stitch(self.readPieces("prtl", f"{key}_{species}", step))
         if (self.files["prtl"] is None) or (step not in self.files["prtl"].keys()):
             self.openParticleFiles([step])
         assert self.files["prtl"] is not None, "Particle files not opened"
@@ -111,6 +130,46 @@ class TristanV2(Plugin):
         assert isinstance(ds, h5_Ds), f"Particle key {key} not found in step {step}"
         return ds
 
+    def readPieces(
+        self, data: str, key: str, step: int, every: bool = False
+    ) -> List[h5_Ds]:
+        pieces = []
+        for fname in self.fileNames(data, step):
+            f = open_h5(fname, self.handles)
+            if key in f.keys():
+                ds = f[key]
+                assert isinstance(ds, h5_Ds), f"{key} in {fname} is not a dataset"
+                pieces.append(ds)
+            elif every:
+                raise ValueError(f"{key} of step {step} is missing from {fname}")
+        assert len(pieces) > 0, f"{key} not found in step {step}"
+        return pieces
+
+    @staticmethod
+    def stitch(pieces: List[h5_Ds]) -> array_t:
+        """
+        Stitch the pieces of a dataset split across several files into a single dask array by concatenating them along their first (slowest varying) axis. Every piece is read by its own tasks, and the chunks never cross the boundaries between the files.
+
+        Raises
+        ------
+        `ValueError`
+            if the pieces do not tile the first axis, i.e., they differ in any other dimension
+        """
+        from dask.array.core import concatenate as da_concatenate
+        from dask.array.core import from_array as da_from_array
+
+        shape = pieces[0].shape[1:]
+        for ds in pieces[1:]:
+            if ds.shape[1:] != shape:
+                raise ValueError(
+                    f"Pieces of {ds.name} do not tile the first axis: "
+                    f"{pieces[0].file.filename} has shape {pieces[0].shape}, "
+                    f"{ds.file.filename} has shape {ds.shape}"
+                )
+        return da_concatenate(
+            [da_from_array(ds, chunks="auto") for ds in pieces], axis=0
+        )
+
     def readSpectrum(self, spec: str, step: int) -> h5_Ds:
         if self.spectra is None:
             raise ValueError("`spectra` cannot be None when calling `readSpectrum`")
@@ -133,12 +192,8 @@ class TristanV2(Plugin):
     def fieldKeys(self) -> List[str]:
         if self.fields is None:
             return []
-        elif "ALL" in self.fields:
-            if len(self.fields) != 1:
-                raise NotImplementedError("fieldKeys not implemented for custom fields")
-            return self.rawFieldKeys()
         else:
-            raise NotImplementedError("fieldKeys not implemented for custom fields")
+            return self.matchKeys(self.rawFieldKeys(), self.fields)
 
     def specKeys(self) -> List[str]:
         if self.spectra is None:
@@ -147,28 +202,49 @@ class TristanV2(Plugin):
             s0 = self.first_step
             self.openSpectrumFiles([s0])
             assert self.files["spec"] is not None, "Spectrum files not opened"
-            return [x for x in list(self.files["spec"][s0].keys()) if x.startswith("n")]
+            return self.matchKeys(
+                [x for x in list(self.files["spec"][s0].keys()) if x.startswith("n")],
+                self.spectra,
+            )
 
     def specBins(self, spec: str) -> Dict[str, array_t]:
+        if spec in self._spec_bins:
+            return self._spec_bins[spec]
         bins = {}
         s0 = self.first_step
         self.openSpectrumFiles([s0])
+        assert self.files["spec"] is not None, "Spectrum files not opened"
+        specfile = self.files["spec"][s0]
         if spec.startswith("nr"):
-            assert self.files["spec"] is not None, "Spectrum files not opened"
-            rbins_ds = self.files["spec"][s0]["rbins"]
+            rbins_ds = specfile["rbins"]
             assert isinstance(rbins_ds, h5_Ds), "Radial bins not found"
             bins["re"] = rbins_ds[:]
         else:
-            assert self.files["spec"] is not None, "Spectrum files not opened"
-            ebins_ds = self.files["spec"][s0]["ebins"]
+            ebins_ds = specfile["ebins"]
             assert isinstance(ebins_ds, h5_Ds), "Energy bins not found"
             bins["e"] = ebins_ds[:]
-            # for xyz in "xyz":
-            #     if xyz + "bins" in self.files["spec"][s0].keys():
-            #         arr = self.files["spec"][s0][xyz + "bins"][:]
-            #         if len(arr) > 1:
-            #             bins[xyz] = arr
 
+        # spatially binned spectra are stored as `(e, z, y, x)`, with singleton axes
+        # for the directions which are not binned
+        ax_mapping = {oldax: newax for oldax, newax in zip(self.origaxes, self.axes)}
+        spatial = {}
+        for ax in self.origaxes:
+            if f"{ax}bins" in specfile.keys():
+                arr = specfile[f"{ax}bins"][:]
+                if len(arr) > 1:
+                    spatial[ax] = arr
+        shape = [n for n in specfile[spec].shape if n > 1]
+        if [len(arr) for arr in spatial.values()] == shape[1:]:
+            params = self.readParams()
+            for ax, arr in spatial.items():
+                newax = ax_mapping[ax]
+                if (self.coord_transform is not None) and (
+                    newax in self.coord_transform.keys()
+                ):
+                    arr = self.coord_transform[newax](arr, params)
+                bins[newax] = arr
+
+        self._spec_bins[spec] = bins
         return bins
 
     def prtlKeys(self, sp: int | None = None) -> List[str]:
@@ -180,29 +256,73 @@ class TristanV2(Plugin):
             s0 = self.first_step
             self.openParticleFiles([s0])
             assert self.files["prtl"] is not None, "Particle files not opened"
-            return [
-                str(k)
-                for k in np.unique(
-                    [
-                        k.split("_")[0]
-                        for k in self.files["prtl"][s0].keys()
-                        if k.endswith(f"_{sp}")
-                    ]
-                )
-            ]
+            return self.matchKeys(
+                [
+                    str(k)
+                    for k in np.unique(
+                        [
+                            k.split("_")[0]
+                            for k in self.files["prtl"][s0].keys()
+                            if k.endswith(f"_{sp}")
+                        ]
+                    )
+                ],
+                [k for k in self.particles if isinstance(k, str)],
+                strict=False,
+            )
 
     def prtlIndex(self, sp: int, step: int) -> array_t:
-        from dask.array.routines import ravel_multi_index as da_ravel_multi_index
-        from dask.array.core import from_array as da_from_array
-        from numpy import int64
-
-        return da_ravel_multi_index(
-            [
-                da_from_array(self.readParticleKey(sp, "ind", step)),
-                da_from_array(self.readParticleKey(sp, "proc", step)),
-            ],
-            [100000000, 100000000],
-        )
+        """
+        Packed 64-bit particle IDs, `ind * 10^8 + proc`, computed once per species and step and shared by all the particle keys. If `index_cache` is set, the IDs are also stored there, together with the size and modification time of the particle files they were read from, so later sessions do not need to read `ind` and `proc` again (until the particle files change).
+        """
+        import numpy as np
+        import os
+
+        if (sp, step) in self._prtl_index:
+            return self._prtl_index[(sp, step)]
+
+        sidecar = None
+        if self.index_cache is not None:
+            import hashlib
+
+            # the name is keyed by the particle files, so runs sharing a cache never mix up
+            sources = [os.path.realpath(f) for f in self.fileNames("prtl", step)]
+            digest = hashlib.sha1("\n".join(sources).encode()).hexdigest()[:16]
+            sidecar = os.path.join(
+                self.index_cache, f"prtl.idx.{sp}.{step:05d}.{digest}.npz"
+            )
+            state = np.array(
+                [(st.st_size, st.st_mtime_ns) for st in map(os.stat, sources)],
+                dtype=np.int64,
+            )
+            if os.path.exists(sidecar):
+                with np.load(sidecar) as stored:
+                    if np.array_equal(stored["state"], state):
+                        self._prtl_index[(sp, step)] = stored["ids"]
+                        return self._prtl_index[(sp, step)]
+
+        ind = np.asarray(self.readParticleKey(sp, "ind", step)[()]).astype(np.int64)
+        proc = np.asarray(self.readParticleKey(sp, "proc", step)[()]).astype(np.int64)
+        for name, arr in (("ind", ind), ("proc", proc)):
+            if len(arr) > 0 and (arr.min() < 0 or arr.max() >= PRTL_INDEX_BASE):
+                raise ValueError(
+                    f"`{name}_{sp}` at step {step} spans [{arr.min()}, {arr.max()}], "
+                    f"outside of [0, {PRTL_INDEX_BASE}) required to pack particle IDs"
+                )
+        ids = ind * PRTL_INDEX_BASE + proc
+        if len(np.unique(ids)) != len(ids):
+            raise ValueError(
+                f"{len(ids) - len(np.unique(ids))} duplicate particle IDs "
+                f"(`ind_{sp}`, `proc_{sp}`) at step {step}"
+            )
+
+        if sidecar is not None:
+            os.makedirs(self.index_cache, exist_ok=True)
+            tmp = f"{sidecar}.{os.getpid()}.tmp.npz"
+            np.savez(tmp, ids=ids, state=state)
+            os.replace(tmp, sidecar)
+        self._prtl_index[(sp, step)] = ids
+        return ids
 
     def prtlSpecies(self) -> List[int]:
         import numpy as np
@@ -213,35 +333,104 @@ class TristanV2(Plugin):
             s0 = self.first_step
             self.openParticleFiles([s0])
             assert self.files["prtl"] is not None, "Particle files not opened"
-            return [
-                int(k)
-                for k in np.unique(
-                    [int(k.split("_")[1]) for k in list(self.files["prtl"][s0].keys())]
-                )
-            ]
+            return self.matchKeys(
+                [
+                    int(k)
+                    for k in np.unique(
+                        [
+                            int(k.split("_")[1])
+                            for k in list(self.files["prtl"][s0].keys())
+                        ]
+                    )
+                ],
+                [k for k in self.particles if isinstance(k, int)],
+            )
 
-    def openH5File(self, data: str, step: int) -> h5_File:
-        import h5py
+    def fileName(self, data: str, step: int) -> str:
         import os
 
-        return h5py.File(
-            os.path.join(self.path, self.fname_templates[data] % step), "r"
-        )
+        return os.path.join(self.path, self.fname_templates[data] % step)
+
+    def fileNames(self, data: str, step: int) -> List[str]:
+        """
+        Find the files holding the data of a given step: either a single file, or pieces of the output split across several files (named `<file>.<piece>`, e.g., `flds.tot.00010.003`).
+        """
+        import glob
+        import os
+
+        if (data, step) not in self._pieces:
+            fname = self.fileName(data, step)
+            if os.path.exists(fname):
+                self._pieces[(data, step)] = [fname]
+            else:
+                pieces = [
+                    f
+                    for f in glob.glob(glob.escape(fname) + ".*")
+                    if f[len(fname) + 1 :].isdigit()
+                ]
+                pieces.sort(key=lambda f: int(f[len(fname) + 1 :]))
+                self._pieces[(data, step)] = pieces if pieces else [fname]
+        return self._pieces[(data, step)]
+
+    def isSplit(self, data: str, step: int) -> bool:
+        return len(self.fileNames(data, step)) > 1
+
+    def availableSteps(self) -> List[int]:
+        import glob
+        import os
+
+        steps = set()
+        for data, template in self.fname_templates.items():
+            prefix = os.path.join(self.path, template.split("%")[0])
+            for f in glob.glob(glob.escape(prefix) + "*"):
+                # pieces of split outputs are named `<file>.<piece>`
+                step = f[len(prefix) :].split(".")[0]
+                if step.isdigit():
+                    steps.add(int(step))
+        return sorted(steps)
+
+    def sourceFiles(self, steps: List[int]) -> List[str]:
+        enabled = {
+            "flds": self.fields,
+            "prtl": self.particles,
+            "spec": self.spectra,
+        }
+        return [
+            fname
+            for data, keys in enabled.items()
+            if keys
+            for step in steps
+            for fname in self.fileNames(data, step)
+        ]
+
+    def openH5File(self, data: str, step: int) -> h5_File:
+        # for split outputs, the first piece provides the metadata
+        return open_h5(self.fileNames(data, step)[0], self.handles)
 
     def openFieldFiles(self, steps: List[int]):
         if self.fields:
-            self.files["flds"] = {step: self.openH5File("flds", step) for step in steps}
+            # files of other steps are kept, since they may be in use by other threads
+            self.files["flds"] = {
+                **(self.files["flds"] or {}),
+                **{step: self.openH5File("flds", step) for step in steps},
+            }
         else:
             self.files["flds"] = None
 
     def openParticleFiles(self, steps: List[int]):
         if self.particles:
-            self.files["prtl"] = {step: self.openH5File("prtl", step) for step in steps}
+            self.files["prtl"] = {
+                **(self.files["prtl"] or {}),
+                **{step: self.openH5File("prtl", step) for step in steps},
+            }
         else:
             self.files["prtl"] = None
 
     def openSpectrumFiles(self, steps: List[int]):
         if self.spectra:
-            self.files["spec"] = {step: self.openH5File("spec", step) for step in steps}
+            self.files["spec"] = {
+                **(self.files["spec"] or {}),
+                **{step: self.openH5File("spec", step) for step in steps},
+            }
         else:
             self.files["spec"] = None
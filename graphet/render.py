@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, List
+from .utils import array_t
+
+
+def _render_frame(
+    frame: Any,
+    fname: str,
+    vmin: float | None,
+    vmax: float | None,
+    figsize: tuple,
+    dpi: int,
+    plot_kwargs: Dict[str, Any],
+) -> str:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import os
+
+    frame = frame.compute(scheduler="synchronous")
+    fig, ax = plt.subplots(figsize=figsize)
+    frame.plot(ax=ax, vmin=vmin, vmax=vmax, **plot_kwargs)
+    # write to a temporary file first, so an interrupted run never leaves a partial frame behind
+    tmp = f"{fname}.tmp.png"
+    fig.savefig(tmp, dpi=dpi)
+    plt.close(fig)
+    os.replace(tmp, fname)
+    return fname
+
+
+def render_frames(
+    data,
+    expr: str | Callable[[Any], array_t],
+    outdir: str,
+    selection: Dict[str, Any] | None = None,
+    executor: Any = None,
+    vmin: float | None = None,
+    vmax: float | None = None,
+    symmetric: bool = False,
+    fname: str = "frame.%05d.png",
+    overwrite: bool = False,
+    figsize: tuple = (8, 6),
+    dpi: int = 150,
+    **plot_kwargs,
+) -> List[str]:
+    """
+    Render 2D slices of a field expression to PNG files, one per step, in parallel.
+
+    Each frame is shipped to the workers as a lazy array, so every worker reads its own steps directly from disk. The colormap limits are shared by all the frames and (unless given) are computed in a single streaming pass over the data before rendering, and stored next to the frames (`limits.json`) along with the expression, the selection and the steps they were computed for. Frames which already exist are skipped, so an interrupted rendering can be resumed with the same limits, without reading the data again for the limits (unless any of these parameters changed).
+
+    Parameters
+    ----------
+    `data` : `Data`
+        the data container
+    `expr` : `str | Callable[[xr.Dataset], xr.DataArray]`
+        the name of the field, or a function of `data.fields` returning the quantity to plot, e.g. `lambda f: f.bx**2 + f.by**2`
+    `outdir` : `str`
+        directory to write the frames to
+    `selection` : `Dict[str, Any]`, optional
+        selection reducing each step to a 2D slice, passed to `xr.DataArray.sel` (default: `None`)
+    `executor` : `concurrent.futures.Executor | Client | Dashboard`, optional
+        where to render the frames (default: a process pool with one process per core)
+    `vmin`, `vmax` : `float`, optional
+        colormap limits (default: the global minimum and maximum over all the steps)
+    `symmetric` : `bool`, optional
+        make the computed colormap limits symmetric around zero (default: `False`)
+    `fname` : `str`, optional
+        template of the frame file names filled with the step number (default: `"frame.%05d.png"`)
+    `overwrite` : `bool`, optional
+        re-render the frames which already exist (default: `False`)
+    `figsize` : `tuple`, optional
+        size of the figure (default: `(8, 6)`)
+    `dpi` : `int`, optional
+        resolution of the frames (default: `150`)
+    `**plot_kwargs` : `Dict[str, Any]`
+        keyword arguments to pass to `xr.DataArray.plot`
+
+    Returns
+    -------
+    `List[str]`
+        the paths of all the frames
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from dask.base import tokenize
+    import multiprocessing
+    import dask
+    import json
+    import os
+
+    assert data.fields is not None, "Fields not loaded"
+    arr = data.fields[expr] if isinstance(expr, str) else expr(data.fields)
+    if selection is not None:
+        arr = arr.sel(**selection)
+    spatial = [d for d in arr.dims if d != "t"]
+    if len(spatial) != 2:
+        raise ValueError(f"Selection must reduce the data to 2D slices, got {spatial}")
+
+    os.makedirs(outdir, exist_ok=True)
+    step_of = dict(zip(data.times, data.steps))
+    steps = [int(step_of[t]) for t in arr.t.values]
+    fnames = [os.path.join(outdir, fname % s) for s in steps]
+    todo = [i for i, f in enumerate(fnames) if overwrite or not os.path.exists(f)]
+
+    if (vmin is None or vmax is None) and todo:
+        # the limits of the existing frames are reused, so a resumed rendering stays consistent,
+        # as long as they were computed for the same expression, selection and steps
+        limits = os.path.join(outdir, "limits.json")
+        params = {
+            "expr": expr if isinstance(expr, str) else tokenize(expr),
+            "selection": tokenize(selection),
+            "steps": steps,
+        }
+        stored = None
+        if len(todo) < len(fnames) and os.path.exists(limits):
+            with open(limits) as f:
+                stored = json.load(f)
+        if isinstance(stored, dict) and stored.get("params") == params:
+            lo, hi = stored["limits"]
+        else:
+            lo, hi = dask.compute(arr.min(dim=spatial).data, arr.max(dim=spatial).data)
+            lo, hi = float(lo.min()), float(hi.max())
+            with open(limits, "w") as f:
+                json.dump({"params": params, "limits": [lo, hi]}, f)
+        if symmetric:
+            hi = max(abs(lo), abs(hi))
+            lo = -hi
+        vmin = lo if vmin is None else vmin
+        vmax = hi if vmax is None else vmax
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+    elif hasattr(executor, "client"):
+        executor = executor.client
+    try:
+        futures = [
+            executor.submit(
+                _render_frame,
+                arr.isel(t=i),
+                fnames[i],
+                vmin,
+                vmax,
+                figsize,
+                dpi,
+                plot_kwargs,
+            )
+            for i in todo
+        ]
+        for future in futures:
+            future.result()
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return fnames
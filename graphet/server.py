@@ -0,0 +1,407 @@
+# Local HTTP server of slices, tiles and spectra of a data container
+#
+#   graphet serve output/ --cfg output/input.cfg --port 8765
+#
+# endpoints (all selections by coordinate value pick the nearest point):
+#   GET /meta                                         steps, times, keys and coordinates (JSON)
+#   GET /field/<key>?t=2.5&z=0.1[&stride=2]           2-D slice of a field
+#   GET /tile/<key>?t=2.5&z=0.1&level=1&tx=0&ty=0     downsampled (by 2^level) tile of a slice
+#   GET /spectrum/<key>?t=2.5                         spectrum at a given time
+# arrays are returned in the `.npy` format (gzip-compressed if the client accepts it),
+# or as PNG images with `format=png` (optionally with `cmap`, `vmin` and `vmax`)
+from typing import Any, Dict, Tuple
+from http.server import BaseHTTPRequestHandler
+
+RESERVED = [
+    "t",
+    "step",
+    "format",
+    "cmap",
+    "vmin",
+    "vmax",
+    "stride",
+    "level",
+    "tx",
+    "ty",
+]
+
+
+def query_int(query: Dict[str, str], name: str, default: int, minimum: int) -> int:
+    """
+    Read an integer parameter of a request.
+
+    Raises
+    ------
+    `ValueError`
+        if the parameter is not an integer, or is below the minimum
+    """
+    value = query.get(name, default)
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"`{name}` must be an integer, got `{value}`")
+    if value < minimum:
+        raise ValueError(f"`{name}` must be at least {minimum}, got {value}")
+    return value
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = 256 * 1000**2):
+        """
+        In-memory cache of encoded responses with least-recently-used eviction.
+
+        Parameters
+        ----------
+        `max_bytes` : `int`, optional
+            maximum total size of the stored responses (default: 256 MB)
+        """
+        from collections import OrderedDict
+        import threading
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any) -> Tuple[bytes, Dict[str, str]] | None:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Any, body: bytes, headers: Dict[str, str]) -> None:
+        with self.lock:
+            if key in self.entries or len(body) > self.max_bytes:
+                return
+            self.entries[key] = (body, headers)
+            self.nbytes += len(body)
+            while self.nbytes > self.max_bytes:
+                _, (old, _) = self.entries.popitem(last=False)
+                self.nbytes -= len(old)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+            }
+
+
+def encode_png(img: Any) -> bytes:
+    """
+    Encode an 8-bit grayscale (`(H, W)`), RGB (`(H, W, 3)`) or RGBA (`(H, W, 4)`) image as PNG.
+    """
+    import numpy as np
+    import struct
+    import zlib
+
+    img = np.ascontiguousarray(img, dtype=np.uint8)
+    height, width = img.shape[:2]
+    color_type = {1: 0, 3: 2, 4: 6}[img.shape[2] if img.ndim == 3 else 1]
+
+    def chunk(tag: bytes, payload: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(payload))
+            + tag
+            + payload
+            + struct.pack(">I", zlib.crc32(tag + payload) & 0xFFFFFFFF)
+        )
+
+    # every scanline is prefixed with its filter type (0, none)
+    raw = np.concatenate(
+        [np.zeros((height, 1), dtype=np.uint8), img.reshape(height, -1)], axis=1
+    )
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def colorize(arr: Any, vmin: float | None, vmax: float | None, cmap: str | None) -> Any:
+    """
+    Map a 2-D array to an 8-bit image (RGBA with a matplotlib colormap if available, grayscale otherwise). Non-finite values are transparent (black in grayscale). The first dimension of the array is vertical and increases upwards.
+    """
+    import numpy as np
+
+    arr = np.asarray(arr, dtype=np.float64)
+    finite = np.isfinite(arr)
+    if vmin is None:
+        vmin = float(arr[finite].min()) if finite.any() else 0.0
+    if vmax is None:
+        vmax = float(arr[finite].max()) if finite.any() else 1.0
+    scaled = np.clip((arr - vmin) / ((vmax - vmin) or 1.0), 0, 1)
+    scaled[~finite] = 0
+    try:
+        import matplotlib
+
+        colors = matplotlib.colormaps[cmap or "viridis"](scaled)
+        colors[~finite] = 0
+        img = (colors * 255).round().astype(np.uint8)
+    except ImportError:
+        img = (scaled * 255).round().astype(np.uint8)
+    return img[::-1]
+
+
+def encode_npy(arr: Any) -> bytes:
+    import numpy as np
+    import io
+
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(arr), allow_pickle=False)
+    return buffer.getvalue()
+
+
+class SliceServer:
+    def __init__(
+        self,
+        data: Any,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        workers: int = 8,
+        cache_bytes: int = 256 * 1000**2,
+        tile_size: int = 256,
+    ):
+        """
+        Local HTTP server of 2-D slices, downsampled tiles and spectra of a data container. Requests are handled in threads, with at most `workers` reads at a time, and the encoded responses are kept in an LRU cache.
+
+        Parameters
+        ----------
+        `data` : `Data`
+            the data container
+        `host`, `port` : `str`, `int`, optional
+            the address to listen at (default: `127.0.0.1:8765`; port `0` picks a free one)
+        `workers` : `int`, optional
+            maximum number of concurrent reads (default: `8`)
+        `cache_bytes` : `int`, optional
+            maximum total size of the cached responses (default: 256 MB)
+        `tile_size` : `int`, optional
+            size of the (square) tiles in pixels (default: `256`)
+        """
+        from http.server import ThreadingHTTPServer
+        import threading
+
+        self.data = data
+        self.tile_size = tile_size
+        self.cache = ResponseCache(cache_bytes)
+        self.readers = threading.BoundedSemaphore(workers)
+        handler = type("Handler", (SliceRequestHandler,), {"app": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def metadata(self) -> Dict[str, Any]:
+        def describe(ds: Any) -> Dict[str, Any]:
+            return {
+                k: {
+                    "dims": list(v.dims),
+                    "shape": list(v.shape),
+                    "dtype": str(v.dtype),
+                }
+                for k, v in ds.data_vars.items()
+            }
+
+        data = self.data
+        meta = {
+            "steps": [int(s) for s in data.steps],
+            "times": [float(t) for t in data.times],
+            "tile_size": self.tile_size,
+        }
+        for name in ["fields", "spectra"]:
+            ds = getattr(data, name)
+            if ds is not None:
+                meta[name] = describe(ds)
+                meta[f"{name}_coords"] = {
+                    c: [float(x) for x in ds.coords[c].values]
+                    for c in ds.coords
+                    if c != "t"
+                }
+        return meta
+
+    def select(self, obj: Any, query: Dict[str, str]) -> Any:
+        data = self.data
+        if "step" in query:
+            matches = (data.steps == int(query["step"])).nonzero()[0]
+            if len(matches) == 0:
+                raise KeyError(f"Unknown step `{query['step']}`")
+            obj = obj.isel(t=int(matches[0]))
+        elif "t" in query:
+            obj = obj.sel(t=float(query["t"]), method="nearest")
+        elif len(data.steps) == 1:
+            obj = obj.isel(t=0)
+        else:
+            raise ValueError("`t` or `step` must be specified")
+        sel = {k: float(v) for k, v in query.items() if k not in RESERVED}
+        unknown = [k for k in sel if k not in obj.dims]
+        if unknown:
+            raise ValueError(f"Unknown dimensions {unknown}, must be in {obj.dims}")
+        return obj.sel(**sel, method="nearest") if sel else obj
+
+    def slice2d(self, key: str, query: Dict[str, str]) -> Any:
+        if self.data.fields is None or key not in self.data.fields:
+            raise KeyError(f"Unknown field `{key}`")
+        obj = self.select(self.data.fields[key], query)
+        if obj.ndim != 2:
+            raise ValueError(
+                f"The selection must leave 2 dimensions, got {list(obj.dims)}"
+            )
+        return obj
+
+    def field(self, key: str, query: Dict[str, str]) -> Any:
+        obj = self.slice2d(key, query)
+        stride = query_int(query, "stride", 1, 1)
+        return obj.isel({d: slice(None, None, stride) for d in obj.dims})
+
+    def tile(self, key: str, query: Dict[str, str]) -> Any:
+        obj = self.slice2d(key, query)
+        factor = 2 ** query_int(query, "level", 0, 0)
+        span = self.tile_size * factor
+        origin = (
+            query_int(query, "ty", 0, 0) * span,
+            query_int(query, "tx", 0, 0) * span,
+        )
+        if any(o < 0 or o >= n for o, n in zip(origin, obj.shape)):
+            raise KeyError("Tile out of range")
+        # only the region of the tile is read at full resolution
+        region = obj.isel({d: slice(o, o + span) for d, o in zip(obj.dims, origin)})
+        if factor == 1:
+            return region
+        return region.coarsen({d: factor for d in obj.dims}, boundary="pad").mean()
+
+    def spectrum(self, key: str, query: Dict[str, str]) -> Any:
+        if self.data.spectra is None or key not in self.data.spectra:
+            raise KeyError(f"Unknown spectrum `{key}`")
+        return self.select(self.data.spectra[key], query)
+
+    def respond(self, route: str, key: str, query: Dict[str, str]) -> Tuple[bytes, str]:
+        """
+        Build the (uncompressed) response to a request.
+
+        Returns
+        -------
+        `Tuple[bytes, str]`
+            the body and its content type
+
+        Raises
+        ------
+        `KeyError`
+            if the route, the key or the tile does not exist
+        `ValueError`
+            if the request is invalid
+        """
+        import json
+
+        if route == "meta":
+            return json.dumps(self.metadata()).encode(), "application/json"
+        handlers = {"field": self.field, "tile": self.tile, "spectrum": self.spectrum}
+        if route not in handlers:
+            raise KeyError(f"Unknown endpoint `{route}`")
+        with self.readers:
+            arr = handlers[route](key, query).compute(scheduler="synchronous").values
+        fmt = query.get("format", "npy")
+        if fmt == "npy":
+            return encode_npy(arr), "application/x-npy"
+        elif fmt == "png":
+            if arr.ndim != 2:
+                raise ValueError("PNG images must be 2-D")
+            img = colorize(
+                arr,
+                float(query["vmin"]) if "vmin" in query else None,
+                float(query["vmax"]) if "vmax" in query else None,
+                query.get("cmap"),
+            )
+            return encode_png(img), "image/png"
+        else:
+            raise ValueError(f"Unknown format `{fmt}`, must be `npy` or `png`")
+
+
+class SliceRequestHandler(BaseHTTPRequestHandler):
+    app: SliceServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        import logging
+
+        logging.getLogger("graphet.log").info(format, *args)
+
+    def do_GET(self) -> None:
+        from urllib.parse import urlsplit, parse_qsl
+        import hashlib
+        import gzip
+
+        url = urlsplit(self.path)
+        route, _, key = url.path.strip("/").partition("/")
+        query = dict(parse_qsl(url.query))
+        compress = "gzip" in self.headers.get("Accept-Encoding", "") and query.get(
+            "format", "npy"
+        ) not in ["png"]
+        cache_key = (route, key, tuple(sorted(query.items())), compress)
+
+        entry = self.app.cache.get(cache_key)
+        if entry is None:
+            try:
+                body, ctype = self.app.respond(route, key, query)
+            except KeyError as e:
+                return self.send_error(404, str(e).strip("'\""))
+            except ValueError as e:
+                return self.send_error(400, str(e))
+            headers = {"Content-Type": ctype}
+            if compress:
+                body = gzip.compress(body, compresslevel=6, mtime=0)
+                headers["Content-Encoding"] = "gzip"
+            headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+            self.app.cache.put(cache_key, body, headers)
+        else:
+            body, headers = entry
+
+        if self.headers.get("If-None-Match") == headers["ETag"]:
+            self.send_response(304)
+            self.send_header("ETag", headers["ETag"])
+            return self.end_headers()
+
+        status, start, end = 200, 0, len(body)
+        ranges = self.headers.get("Range")
+        if ranges is not None and ranges.startswith("bytes=") and "," not in ranges:
+            first, _, last = ranges[len("bytes=") :].partition("-")
+            try:
+                if first:
+                    start, end = int(first), min(int(last) + 1 if last else end, end)
+                else:
+                    start = max(end - int(last), 0)
+            except ValueError:
+                return self.send_error(400, "Malformed range")
+            if start >= end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                return self.end_headers()
+            status = 206
+
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "no-cache")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(body)}")
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        self.wfile.write(body[start:end])
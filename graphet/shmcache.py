@@ -0,0 +1,380 @@
+# Cross-process cache of decoded chunks in shared memory
+#
+# start the cache service once per node:
+#   python -m graphet.shmcache --address 127.0.0.1:5577 --max-bytes 64e9
+# which prints a freshly generated key the clients authenticate with (or pass your own with
+# `--authkey`); export it to the processes reading the data:
+#   export GRAPHET_SHM_AUTHKEY=<key>
+# and point the data containers to the service:
+#   Data(TristanV2, ..., shm_cache="127.0.0.1:5577")
+from typing import Any, Dict, Tuple
+from multiprocessing.managers import BaseManager
+from multiprocessing.shared_memory import SharedMemory
+
+AUTHKEY_ENV = "GRAPHET_SHM_AUTHKEY"
+
+
+def parse_address(address: str | Tuple[str, int]) -> Tuple[str, int]:
+    if isinstance(address, str):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def resolve_authkey(authkey: str | bytes | None) -> bytes:
+    """
+    The key to authenticate with the cache service: the given one, or the one from the `GRAPHET_SHM_AUTHKEY` environment variable.
+
+    Raises
+    ------
+    `ValueError`
+        if no key is given and the environment variable is not set
+    """
+    import os
+
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        raise ValueError(
+            f"No key for the shared-memory cache: pass `authkey` or set `{AUTHKEY_ENV}`"
+        )
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+class Segment(SharedMemory):
+    """
+    Shared memory segment owned by the cache service, attached without being tracked (so this process never unlinks it). Arrays built on top of it keep a valid mapping for as long as they are alive, even after the service evicts the segment or this object is dropped.
+    """
+
+    def __init__(self, name: str):
+        import inspect
+
+        if "track" in inspect.signature(SharedMemory).parameters:
+            super().__init__(name=name, track=False)
+        else:
+            from multiprocessing import resource_tracker
+
+            super().__init__(name=name)
+            resource_tracker.unregister(f"/{self.name}", "shared_memory")
+
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            # still mapped by arrays, which release the mapping when they are gone
+            pass
+
+
+class CacheIndex:
+    def __init__(self, max_bytes: int, pending_timeout: float = 60.0):
+        """
+        Index of the chunks stored in shared memory, living in the cache service. The service owns all the segments and unlinks them when they are evicted (least recently used first); arrays which clients still hold keep a valid mapping of their segment.
+
+        Parameters
+        ----------
+        `max_bytes` : `int`
+            maximum total size of the stored chunks
+        `pending_timeout` : `float`, optional
+            seconds after which a reservation which was neither committed nor aborted (e.g., its client died while writing) is dropped, so the chunk can be stored by another client (default: `60`)
+        """
+        from collections import OrderedDict
+        import threading
+
+        # the service handles each client connection in its own thread
+        self.lock = threading.RLock()
+        self.max_bytes = max_bytes
+        self.pending_timeout = pending_timeout
+        self.nbytes = 0
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key: str) -> Tuple[str, Tuple[int, ...], str] | None:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                shm, shape, dtype = self.entries[key]
+                return shm.name, shape, dtype
+            self.misses += 1
+            return None
+
+    def reserve(self, key: str, nbytes: int) -> str | None:
+        import time
+
+        with self.lock:
+            self.expire()
+            if key in self.entries or key in self.pending or nbytes > self.max_bytes:
+                return None
+            self.evict(self.max_bytes - nbytes)
+            shm = SharedMemory(create=True, size=max(nbytes, 1))
+            self.pending[key] = (shm, nbytes, time.monotonic())
+            self.nbytes += nbytes
+            return shm.name
+
+    def commit(self, key: str, shape: Tuple[int, ...], dtype: str) -> None:
+        with self.lock:
+            if key in self.pending:
+                shm, _, _ = self.pending.pop(key)
+                self.entries[key] = (shm, tuple(shape), dtype)
+
+    def abort(self, key: str) -> None:
+        with self.lock:
+            if key in self.pending:
+                shm, nbytes, _ = self.pending.pop(key)
+                self.release(shm, nbytes)
+
+    def expire(self) -> None:
+        import time
+
+        with self.lock:
+            deadline = time.monotonic() - self.pending_timeout
+            for key in [k for k, (_, _, t) in self.pending.items() if t < deadline]:
+                self.abort(key)
+
+    def release(self, shm: Any, nbytes: int) -> None:
+        shm.close()
+        shm.unlink()
+        self.nbytes -= nbytes
+
+    def evict(self, max_bytes: int) -> None:
+        import numpy as np
+
+        with self.lock:
+            while self.entries and self.nbytes > max_bytes:
+                _, (shm, shape, dtype) = self.entries.popitem(last=False)
+                self.release(shm, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+
+    def clear(self) -> None:
+        self.evict(0)
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class CacheServerManager(BaseManager):
+    pass
+
+
+class CacheClientManager(BaseManager):
+    pass
+
+
+CacheClientManager.register("index")
+
+
+def serve(
+    address: str | Tuple[str, int],
+    max_bytes: int,
+    authkey: str | bytes | None = None,
+    pending_timeout: float = 60.0,
+) -> None:
+    """
+    Run the cache service (blocks until the process is terminated).
+
+    Parameters
+    ----------
+    `address` : `str | Tuple[str, int]`
+        the address to listen at, e.g., `"127.0.0.1:5577"`
+    `max_bytes` : `int`
+        maximum total size of the stored chunks
+    `authkey` : `str | bytes`, optional
+        the key the clients authenticate with (default: `None`, the `GRAPHET_SHM_AUTHKEY` environment variable)
+    `pending_timeout` : `float`, optional
+        seconds after which uncommitted reservations are dropped (default: `60`)
+    """
+    index = CacheIndex(max_bytes, pending_timeout)
+    CacheServerManager.register("index", callable=lambda: index)
+    manager = CacheServerManager(
+        address=parse_address(address), authkey=resolve_authkey(authkey)
+    )
+    server = manager.get_server()
+    try:
+        server.serve_forever()
+    finally:
+        index.clear()
+
+
+class SharedCacheClient:
+    def __init__(
+        self, address: str | Tuple[str, int], authkey: str | bytes | None = None
+    ):
+        """
+        Client of the shared-memory chunk cache. Connects lazily, so it can be pickled and shipped to other processes.
+
+        Parameters
+        ----------
+        `address` : `str | Tuple[str, int]`
+            the address of the cache service
+        `authkey` : `str | bytes`, optional
+            the key to authenticate with (default: `None`, the `GRAPHET_SHM_AUTHKEY` environment variable)
+        """
+        self.address = parse_address(address)
+        self.authkey = resolve_authkey(authkey)
+        self._index = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"address": self.address, "authkey": self.authkey}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state["address"], state["authkey"])
+
+    @property
+    def index(self) -> Any:
+        if self._index is None:
+            manager = CacheClientManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            self._index = manager.index()
+        return self._index
+
+    def get(self, key: str) -> Any:
+        """
+        Look up a chunk.
+
+        Parameters
+        ----------
+        `key` : `str`
+            the key of the chunk
+
+        Returns
+        -------
+        `np.array | None`
+            read-only view of the chunk in shared memory (or `None` if not cached)
+        """
+        import numpy as np
+
+        found = self.index.lookup(key)
+        if found is None:
+            return None
+        name, shape, dtype = found
+        segment = Segment(name)
+        arr = np.frombuffer(segment.buf, dtype=dtype, count=int(np.prod(shape)))
+        arr = arr.reshape(shape)
+        arr.flags.writeable = False
+        return arr
+
+    def put(self, key: str, arr: Any) -> None:
+        """
+        Store a chunk (unless it is already being stored by another client).
+
+        Parameters
+        ----------
+        `key` : `str`
+            the key of the chunk
+        `arr` : `np.array`
+            the chunk
+        """
+        import numpy as np
+
+        arr = np.ascontiguousarray(arr)
+        name = self.index.reserve(key, arr.nbytes)
+        if name is None:
+            return
+        try:
+            segment = Segment(name)
+            view = np.frombuffer(segment.buf, dtype=arr.dtype, count=arr.size)
+            view[...] = arr.ravel()
+            del view
+            segment.close()
+            self.index.commit(key, arr.shape, arr.dtype.str)
+        except Exception:
+            self.index.abort(key)
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        return self.index.stats()
+
+    def clear(self) -> None:
+        self.index.clear()
+
+
+class SharedCachedDataset:
+    def __init__(self, ds: Any, client: SharedCacheClient):
+        """
+        Array-like view of a dataset (an HDF5 dataset or any of its wrappers) whose reads go through the shared-memory chunk cache. The chunks are keyed by the file, the dataset, its dtype, the selection and the modification time of the file.
+
+        Parameters
+        ----------
+        `ds` : `Any`
+            the dataset
+        `client` : `SharedCacheClient`
+            the cache client
+        """
+        self.ds = ds
+        self.client = client
+        self.dtype = ds.dtype
+        self.shape = ds.shape
+        self.ndim = len(ds.shape)
+        self.chunks = getattr(ds, "chunks", None)
+
+    def __getitem__(self, sel):
+        from dask.base import tokenize
+        import numpy as np
+
+        key = tokenize(self.ds, sel)
+        arr = self.client.get(key)
+        if arr is None:
+            arr = np.asarray(self.ds[sel])
+            self.client.put(key, arr)
+        return arr
+
+    def __array__(self, dtype=None, copy=None):
+        import numpy as np
+
+        arr = self[()]
+        return np.array(arr, dtype=dtype) if dtype is not None else arr
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+
+def _register_tokenizer() -> None:
+    from dask.base import normalize_token
+
+    normalize_token.register(SharedCachedDataset)(
+        lambda c: ("SharedCachedDataset", normalize_token(c.ds))
+    )
+
+
+_register_tokenizer()
+
+
+def main():
+    import argparse
+    import secrets
+    import os
+
+    parser = argparse.ArgumentParser(
+        description="shared-memory chunk cache service for graph-et"
+    )
+    parser.add_argument("--address", default="127.0.0.1:5577")
+    parser.add_argument("--max-bytes", type=float, default=16e9)
+    parser.add_argument(
+        "--authkey",
+        default=None,
+        help=f"key the clients authenticate with (default: `{AUTHKEY_ENV}`, or a generated one)",
+    )
+    parser.add_argument(
+        "--pending-timeout",
+        type=float,
+        default=60.0,
+        help="seconds after which uncommitted chunks are dropped",
+    )
+    args = parser.parse_args()
+    authkey = args.authkey or os.environ.get(AUTHKEY_ENV)
+    if not authkey:
+        authkey = secrets.token_hex(16)
+        print(f"export {AUTHKEY_ENV}={authkey}", flush=True)
+    serve(args.address, int(args.max_bytes), authkey, args.pending_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+from typing import Any, Dict, List
+
+
+def summarize(arr: Any, sketch_size: int = 1001) -> Dict[str, Any]:
+    """
+    Compute mergeable summary statistics of an array (ignoring non-finite values).
+
+    Parameters
+    ----------
+    `arr` : `np.array`
+        the values
+    `sketch_size` : `int`, optional
+        number of evenly spaced quantiles kept as the quantile sketch (default: `1001`)
+
+    Returns
+    -------
+    `Dict[str, Any]`
+        count, min, max, sum, sum of squares, and the quantile sketch of the finite values
+    """
+    import numpy as np
+
+    values = np.asarray(arr).ravel()
+    values = values[np.isfinite(values)].astype(np.float64)
+    if len(values) == 0:
+        return {
+            "count": 0,
+            "min": np.nan,
+            "max": np.nan,
+            "sum": 0.0,
+            "sumsq": 0.0,
+            "sketch": np.full(sketch_size, np.nan),
+        }
+    return {
+        "count": len(values),
+        "min": values.min(),
+        "max": values.max(),
+        "sum": values.sum(),
+        "sumsq": np.dot(values, values),
+        "sketch": np.quantile(values, np.linspace(0, 1, sketch_size)),
+    }
+
+
+def sketch_quantiles(
+    sketches: List[Any], counts: List[int], quantiles: List[float]
+) -> Any:
+    """
+    Estimate quantiles of the union of several datasets from their quantile sketches. Each point of a sketch stands for an equal share of the values of its dataset, so the estimate is accurate to about `1 / sketch_size` in rank.
+
+    Parameters
+    ----------
+    `sketches` : `List[np.array]`
+        the quantile sketches (as returned by `summarize`)
+    `counts` : `List[int]`
+        number of values summarized by each sketch
+    `quantiles` : `List[float]`
+        the quantiles to estimate
+
+    Returns
+    -------
+    `np.array`
+        the estimated quantiles
+    """
+    import numpy as np
+
+    points = np.concatenate([s for s, n in zip(sketches, counts) if n > 0] + [[]])
+    weights = np.concatenate(
+        [np.full(len(s), n / len(s)) for s, n in zip(sketches, counts) if n > 0] + [[]]
+    )
+    if len(points) == 0:
+        return np.full(len(quantiles), np.nan)
+    order = np.argsort(points)
+    points, weights = points[order], weights[order]
+    ranks = (np.cumsum(weights) - weights / 2) / weights.sum()
+    return np.interp(quantiles, ranks, points)
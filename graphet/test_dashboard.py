@@ -0,0 +1,88 @@
+def test_profile_config():
+    from graphet.dashboard import profile_config, PROFILES
+    import pytest
+
+    for profile in PROFILES.keys():
+        cluster_kwargs, config, handle_cache = profile_config(profile)
+        assert cluster_kwargs["processes"]
+        assert handle_cache > 0
+        assert all(k.startswith("distributed.worker.memory.") for k in config)
+
+    cluster_kwargs, _, _ = profile_config("io-heavy", n_workers=3)
+    assert cluster_kwargs["n_workers"] == 3
+    assert cluster_kwargs["threads_per_worker"] == 1
+
+    with pytest.raises(ValueError):
+        profile_config("unknown")
+
+
+def test_lazy_distributed():
+    import subprocess
+    import sys
+
+    # `distributed` is only imported when a cluster is used
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, graphet; print('distributed' in sys.modules)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == "False"
+
+    from graphet.dashboard import handle_cache_plugin
+    from distributed import WorkerPlugin
+
+    plugin = handle_cache_plugin(8, ["a.h5"])
+    assert isinstance(plugin, WorkerPlugin)
+    assert (plugin.maxsize, plugin.fnames) == (8, ["a.h5"])
+
+
+def test_pickleable_datasets():
+    from graphet.plugins import TristanV2
+    import numpy as np
+    import pickle
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    plugin = TristanV2(path=f"{fdir}/tests/data/tristanv2/", first_step=0)
+    ds = plugin.readField("bx", 2)
+    assert np.all(pickle.loads(pickle.dumps(ds))[:] == ds[:])
+    assert len(plugin.sourceFiles([0, 1])) == 6
+
+
+def test_file_handles_released():
+    from graphet.plugins import TristanV2
+    from graphet import Data
+    import contextlib
+    import gc
+    import io
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    path = f"{fdir}/tests/data/tristanv2/"
+
+    def nfds():
+        gc.collect()
+        return len(os.listdir("/proc/self/fd"))
+
+    counts = []
+    for s in range(5):
+        with contextlib.redirect_stdout(io.StringIO()):
+            d = Data(TristanV2, steps=[s], path=path, first_step=s)
+        # lazy data outlives its container, keeping the files it reads open
+        bx = d.fields.bx
+        del d
+        assert float(bx.mean()) == float(bx.mean())
+        del bx
+        counts.append(nfds())
+    assert len(set(counts)) == 1
+
+    plugin = TristanV2(path=path, first_step=0)
+    plugin.readField("bx", 0)
+    assert len(plugin.handles) == 1
+    plugin.close()
+    assert plugin.handles == {}
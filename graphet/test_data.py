@@ -0,0 +1,553 @@
+import os
+
+fdir = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(**kwargs):
+    from graphet.plugins import TristanV2
+    from graphet import Data
+
+    kwargs.setdefault("steps", range(5))
+    return Data(
+        TristanV2,
+        path=f"{fdir}/tests/data/tristanv2/",
+        first_step=0,
+        swapaxes=[(0, 1), (2, 1)],
+        **kwargs,
+    )
+
+
+def test_iter_steps():
+    import numpy as np
+
+    d = load()
+    snapshots = list(
+        d.iter_steps(keys=["bx", "by"], selection={"x": slice(5, 10)}, prefetch=3)
+    )
+    assert len(snapshots) == 5
+    for i, snap in enumerate(snapshots):
+        assert sorted(snap.data_vars) == ["bx", "by"]
+        assert snap.t.values[()] == d.fields.t.values[i]
+        assert np.all(
+            snap.bx.values == d.fields.bx.sel(x=slice(5, 10)).isel(t=i).values
+        )
+    assert len(list(d.iter_steps(max_bytes=1))) == 5
+
+
+def test_async_reads():
+    import threading
+    import asyncio
+    import numpy as np
+
+    d = load()
+    t = d.times[2]
+    # the files of the steps are looked up off the event loop
+    threads = []
+    sourceFiles = d.plugin.sourceFiles
+    d.plugin.sourceFiles = lambda steps: (
+        threads.append(threading.current_thread()) or sourceFiles(steps)
+    )
+
+    async def serve():
+        bx, bx_again, by = await asyncio.gather(
+            d.aget("bx", t=t, x=slice(5, 10)),
+            d.aget("bx", t=t, x=slice(5, 10)),
+            d.aget("by", t=t),
+        )
+        spec = await d.aget("n2", t=t)
+        snapshots = [s async for s in d.aiter_steps(["bx"], prefetch=3)]
+        return bx, bx_again, by, spec, snapshots
+
+    bx, bx_again, by, spec, snapshots = asyncio.run(serve())
+    assert bx is bx_again
+    assert np.all(bx.values == d.fields.bx.sel(x=slice(5, 10)).isel(t=2).values)
+    assert np.all(by.values == d.fields.by.isel(t=2).values)
+    assert np.all(spec.values == d.spectra.n2.isel(t=2).values)
+    assert len(snapshots) == 5
+    assert all(
+        np.all(s.bx.values == d.fields.bx.isel(t=i).values)
+        for i, s in enumerate(snapshots)
+    )
+    # a new event loop gets its own primitives
+    assert np.all(asyncio.run(d.aget("by", t=t)).values == by.values)
+    assert threads and threading.main_thread() not in threads
+
+
+def test_render_frames(tmp_path, monkeypatch):
+    import pytest
+    import dask
+    import json
+
+    pytest.importorskip("matplotlib")
+    from graphet.render import render_frames
+
+    d = load()
+    fnames = render_frames(
+        d, lambda f: f.bx**2 + f.by**2, str(tmp_path), selection={"x": 10}
+    )
+    assert len(fnames) == 5
+    assert all(os.path.exists(f) for f in fnames)
+    mtimes = [os.path.getmtime(f) for f in fnames]
+    os.remove(fnames[2])
+    render_frames(d, lambda f: f.bx**2 + f.by**2, str(tmp_path), selection={"x": 10})
+    assert [os.path.getmtime(f) for i, f in enumerate(fnames) if i != 2] == [
+        m for i, m in enumerate(mtimes) if i != 2
+    ]
+    assert os.path.exists(fnames[2])
+
+    # limits computed for another expression are not reused
+    with open(tmp_path / "limits.json") as f:
+        limits = json.load(f)
+    os.remove(fnames[2])
+    render_frames(d, lambda f: f.bz, str(tmp_path), selection={"x": 10})
+    with open(tmp_path / "limits.json") as f:
+        other = json.load(f)
+    assert other["params"]["steps"] == limits["params"]["steps"]
+    assert other["params"]["expr"] != limits["params"]["expr"]
+    assert other["limits"][0] < 0 <= limits["limits"][0]
+
+    # frames are named by step; when they all exist, the data is not read again
+    def fail(*args, **kwargs):
+        raise AssertionError("data read")
+
+    monkeypatch.setattr(dask, "compute", fail)
+    mtimes = [os.path.getmtime(f) for f in fnames]
+    subset = render_frames(
+        load(steps=range(2, 5)),
+        lambda f: f.bx**2 + f.by**2,
+        str(tmp_path),
+        selection={"x": 10},
+    )
+    assert subset == fnames[2:]
+    assert [os.path.getmtime(f) for f in fnames] == mtimes
+
+
+def test_result_cache(tmp_path):
+    import numpy as np
+
+    d = load(cache=str(tmp_path))
+    mean = d.compute(d.fields.bx.mean(["x", "y", "z"]))
+    assert d.cache.stats["misses"] == 1
+    assert np.all(d.compute(d.fields.bx.mean(["x", "y", "z"])) == mean)
+    assert d.cache.stats["hits"] == 1
+
+    d2 = load(cache=str(tmp_path))
+    assert np.all(d2.compute(d2.fields.bx.mean(["x", "y", "z"])) == mean)
+    d2.compute(d2.spectra.n2.mean("t"))
+    assert d2.cache.stats == {
+        "hits": 1,
+        "misses": 1,
+        "entries": 2,
+        "bytes": d2.cache.stats["bytes"],
+    }
+
+    d3 = load(cache=str(tmp_path), cache_size=1)
+    d3.compute(d3.spectra.n1.mean("t"))
+    assert d3.cache.stats["entries"] == 0
+
+
+def test_eager_spectra():
+    import numpy as np
+
+    d_eager = load()
+    d_lazy = load(eager_bytes=0)
+    for sk in ["n1", "n2", "n3", "n4"]:
+        assert isinstance(d_eager.spectra[sk].data, np.ndarray)
+        assert not isinstance(d_lazy.spectra[sk].data, np.ndarray)
+        assert np.all(d_eager.spectra[sk].values == d_lazy.spectra[sk].values)
+
+
+def test_dtypes():
+    import numpy as np
+    import pytest
+
+    d = load()
+    d32 = load(dtypes="float32")
+    assert d32.fields.bx.dtype == np.float32
+    assert d32.fields.xx.dtype == d.fields.xx.dtype
+    assert d32.particles[2].u.dtype == np.float32
+    assert np.allclose(d32.fields.bx.values, d.fields.bx.values, rtol=1e-6)
+
+    with pytest.warns(UserWarning):
+        d_mixed = load(dtypes={"bx": "float64", "u*": "float32", "*": "float16"})
+    assert d_mixed.fields.bx.dtype == np.float64
+    assert d_mixed.fields.by.dtype == np.float16
+    assert d_mixed.particles[2].u.dtype == np.float32
+    # integer keys keep their exact values under patterns, unless named explicitly
+    assert d_mixed.plugin.castDtype("ind", np.int64) is None
+    assert np.array_equal(
+        d_mixed.particles[2].ind.values, d.particles[2].ind.values, equal_nan=True
+    )
+    assert np.all(d_mixed.particles[2].idx.values == d.particles[2].idx.values)
+    assert load(dtypes={"ind": "int32"}).plugin.castDtype("ind", np.int64) == np.int32
+
+    with pytest.warns(UserWarning, match="by"):
+        load(dtypes={"by": "float16"})
+
+
+def test_field_stats():
+    import numpy as np
+
+    d = load()
+    stats = d.field_stats(keys=["bx", "xx"], quantiles=[0.1, 0.5, 0.9])
+    bx = d.fields.bx.values
+    assert np.allclose(stats.sel(key="bx")["max"], bx.max(axis=(1, 2, 3)))
+    assert np.allclose(stats.sel(key="bx")["mean"], bx.mean(axis=(1, 2, 3)))
+    assert np.allclose(
+        stats.sel(key="bx")["rms"], np.sqrt((bx**2).mean(axis=(1, 2, 3)))
+    )
+    assert np.isclose(stats.global_min.sel(key="xx"), 0)
+    assert np.isclose(stats.global_max.sel(key="xx"), 29)
+    assert np.isclose(stats.global_rms.sel(key="bx"), np.sqrt((bx**2).mean()))
+    assert np.allclose(
+        stats.quantiles.sel(key="bx", t=2),
+        np.quantile(bx[2], [0.1, 0.5, 0.9]),
+        atol=1e-3,
+    )
+    assert np.allclose(
+        stats.global_quantiles.sel(key="bx"),
+        np.quantile(bx, [0.1, 0.5, 0.9]),
+        atol=1e-2,
+    )
+
+
+def test_field_group():
+    from dask.optimization import cull
+    from dask.core import flatten
+    import numpy as np
+
+    d = load()
+    group = d.field_group(["bx", "by", "xx"])
+    # the fields loaded one by one are the reference
+    for k in ["bx", "by", "xx"]:
+        ref = d.fields[k]
+        assert not any("read-group-" in str(key) for key in ref.data.__dask_graph__())
+        assert group[k].dims == ref.dims
+        assert np.array_equal(group[k].values, ref.values)
+    bsq = group.bx**2 + group.by**2
+    assert np.array_equal(bsq.values, (d.fields.bx**2 + d.fields.by**2).values)
+    # one read task per chunk region of the step, shared by both fields
+    arr = bsq.isel(t=2).data
+    graph, _ = cull(dict(arr.__dask_graph__()), list(flatten(arr.__dask_keys__())))
+    reads = [k for k in graph if k[0].startswith("read-group-")]
+    assert len(reads) == len(set(k[1:] for k in reads)) > 0
+
+
+def test_deposit():
+    import numpy as np
+
+    d = load()
+    prtls = d.particles[2]
+    dens = d.deposit(2, shape="NGP")
+    assert dens.dims == d.fields.bx.dims
+    assert dens.shape == d.fields.bx.shape
+    counts = dens.sum(["x", "y", "z"]).values
+    inside = (
+        (np.rint(prtls.x) >= 0)
+        & (np.rint(prtls.x) < 30)
+        & (np.rint(prtls.y) >= 0)
+        & (np.rint(prtls.y) < 25)
+        & (np.rint(prtls.z) >= 0)
+        & (np.rint(prtls.z) < 20)
+    )
+    assert np.all(counts == inside.sum("idx").values)
+
+    # a single particle with CIC spreads over 8 nodes with weights summing to its weight
+    step = prtls.isel(t=1)
+    interior = np.isfinite(step.x.values)
+    for ax, n in [("x", 30), ("y", 25), ("z", 20)]:
+        interior &= (step[ax].values > 1) & (step[ax].values < n - 2)
+    i = int(np.flatnonzero(interior)[0])
+    target = step.idx.values[i]
+    cic = d.deposit(
+        2, weights="u", mask=lambda p: p.idx == target, shape="CIC", t=d.fields.t[1]
+    )
+    assert cic.shape == (1, *d.fields.bx.shape[1:])
+    assert np.count_nonzero(cic.values) <= 8
+    # in-memory masks are split along the chunks of the particles
+    multi = load()
+    multi.particles[2] = multi.particles[2].chunk({"idx": -(-prtls.sizes["idx"] // 3)})
+    assert len(multi.particles[2].x.chunks[1]) == 3
+    assert np.allclose(
+        multi.deposit(
+            2,
+            weights="u",
+            mask=lambda p: p.idx == target,
+            shape="CIC",
+            t=d.fields.t[1],
+        ).values,
+        cic.values,
+    )
+    assert np.isclose(cic.values.sum(), step.u.values[i])
+    com = [float((cic * cic[ax]).sum() / cic.sum()) for ax in ["x", "y", "z"]]
+    assert np.allclose(com, [step.x.values[i], step.y.values[i], step.z.values[i]])
+
+
+def test_power_spectrum(monkeypatch):
+    from graphet.fourier import SpectrumPlan
+    import numpy as np
+    import pytest
+    import pickle
+
+    d = load()
+    spec = d.power_spectrum(["bx", "by"])
+    assert spec.dims == ("t", "k")
+    assert spec.shape[0] == 5
+    # Parseval: the spectrum sums to the mean square of the fields
+    assert np.allclose(
+        spec.sum("k").values,
+        (d.fields.bx**2 + d.fields.by**2).mean(["x", "y", "z"]).values,
+    )
+    spec = d.power_spectrum(["bz"], t=d.fields.t[3], bins=np.linspace(0, 10, 11))
+    assert spec.shape == (1, 10)
+    assert np.allclose(spec.sum("k").values, (d.fields.bz[3] ** 2).mean().values)
+    # the plan shipped with every step task does not grow with the grid
+    plan = SpectrumPlan((512, 512, 512), np.ones(3))
+    assert len(pickle.dumps(plan)) < 64 * 1024
+
+    # the binning is computed by the first step only, then reused by the process
+    calls = []
+    compute_index = SpectrumPlan.computeIndex
+    monkeypatch.setattr(
+        SpectrumPlan,
+        "computeIndex",
+        lambda self, i: calls.append(i) or compute_index(self, i),
+    )
+    spec = d.power_spectrum(["bx"], bins=7).compute()
+    assert sorted(calls) == list(range(d.fields.sizes[d.fields.bx.dims[1]]))
+    with pytest.raises(ValueError, match="At least one field"):
+        d.power_spectrum([])
+
+
+def test_estimate():
+    import numpy as np
+    import pytest
+
+    d = load(memory_budget=1050000, over_budget="stream")
+    cost = d.estimate(d.fields.bx)
+    assert cost["read_bytes"] == cost["result_bytes"] == d.fields.bx.nbytes
+    assert cost["files"] == 5 and cost["tasks"] > 0
+    cost = d.estimate(d.fields.bx.isel(t=1, x=3))
+    assert cost["files"] == 1 and cost["read_bytes"] == d.fields.bx.isel(t=1).nbytes
+    assert d.estimate(d.field_group(["bx", "by"]).bx.mean())["read_bytes"] == 2 * (
+        d.fields.bx.nbytes
+    )
+    # eagerly loaded spectra are already in memory
+    assert isinstance(d.spectra.n1.data, np.ndarray)
+    lazy = d.estimate(d.fields.bx.mean(["x", "y", "z"]))
+    cost = d.estimate(d.spectra.n1 * d.fields.bx.mean(["x", "y", "z"]))
+    assert lazy["resident_bytes"] == 0
+    assert cost["resident_bytes"] == d.spectra.n1.nbytes
+    assert cost["peak_bytes"] >= lazy["peak_bytes"] + d.spectra.n1.nbytes
+
+    streamed = d.compute(d.fields[["bx", "by"]].isel(y=slice(0, 10)))
+    assert np.all(streamed.by.values == d.fields.by.isel(y=slice(0, 10)).values)
+    assert np.all(d.compute(d.fields.bx).values == d.fields.bx.values)
+
+    d.over_budget = "raise"
+    with pytest.raises(MemoryError, match="exceeds the budget"):
+        d.compute(d.fields.bx)
+    assert np.isclose(d.compute(d.fields.bx.mean()), d.fields.bx.mean())
+
+
+def test_estimate_tuple_graphs(monkeypatch):
+    from graphet.estimate import read_cost
+    import sys
+
+    # graphs of dask versions without `dask._task_spec` are made of plain tuples
+    monkeypatch.setitem(sys.modules, "dask._task_spec", None)
+    ds = load().plugin.readField("bx", 0)
+    graph = {"source": ds}
+    task = (lambda a, b: a[b], "source", (slice(0, 2), slice(None), slice(None)))
+    assert read_cost(task, graph) == (
+        2 * ds.shape[1] * ds.shape[2] * ds.dtype.itemsize,
+        [ds.file.filename],
+    )
+    assert read_cost((sum, [1, 2]), graph) is None
+
+
+def test_gather():
+    import dask.config
+    import numpy as np
+    import pytest
+
+    d = load()
+    p = d.particles[4].isel(t=slice(1, 3)).compute()
+    t = p.t.values
+    lims = {x: (d.fields[x].values.min(), d.fields[x].values.max()) for x in "xyz"}
+    with dask.config.set({"array.chunk-size": "2KiB"}):
+        assert d.field_group(["xx"]).xx.data.numblocks[1:] != (1, 1, 1)
+        # linear interpolation of the coordinates is exact inside the grid
+        g = d.gather(4, ["xx", "yy", "zz", "bx"], t=slice(t[0], t[-1]))
+        assert sorted(g.data_vars) == ["bx", "xx", "yy", "zz"]
+        assert g.sizes == {"t": 2, "idx": p.sizes["idx"]}
+        g = g.compute()
+        for x in "xyz":
+            assert np.allclose(g[x * 2], p[x].clip(*lims[x]), equal_nan=True)
+        ngp = d.gather(4, ["bx"], t=t[1], order="NGP").compute()
+
+    present = np.isfinite(p.x.isel(t=1).values)
+    nearest = d.fields.bx.sel(t=t[1]).sel(
+        {x: p[x].isel(t=1)[present] for x in "xyz"}, method="nearest"
+    )
+    assert np.allclose(ngp.bx.isel(t=0).values[present], nearest.values)
+    assert np.all(np.isnan(ngp.bx.isel(t=0).values[~present]))
+    assert np.allclose(
+        g.bx.isel(t=1), d.gather(4, ["bx"], t=t[1]).bx.isel(t=0), equal_nan=True
+    )
+    with pytest.raises(ValueError):
+        d.gather(4, ["bx"], order="cubic")
+
+
+def test_trajectories(tmp_path):
+    import numpy as np
+    import pytest
+    import h5py
+
+    d = load()
+    store = str(tmp_path / "traj.h5")
+    d.to_trajectories(store, species=[2])
+    # interrupt the conversion after the third step
+    with h5py.File(store, "a") as f:
+        f["2/done"][3:] = False
+        f["2/u"][:, 3:] = np.nan
+    with pytest.raises(ValueError, match="not converted yet"):
+        load(trajectories=store)
+    d.to_trajectories(store, species=[2])
+
+    t = load(trajectories=store)
+    assert list(t.particles.keys()) == [2]
+    p, q = d.particles[2], t.particles[2]
+    assert sorted(q.data_vars) == sorted(
+        k for k in p.data_vars if k not in ["ind", "proc"]
+    )
+    ids = p.idx.values[::7]
+    for k in q.data_vars:
+        assert np.allclose(
+            q[k].sel(idx=ids).values, p[k].sel(idx=ids).values, equal_nan=True
+        )
+    with pytest.raises(ValueError, match="different steps"):
+        load(steps=range(3)).to_trajectories(store)
+
+    # steps are written a block of steps at a time, sized by the memory budget of the buffer,
+    # with a bounded number of reads in flight
+    with h5py.File(store, "r") as f:
+        assert f["2/u"].chunks[1] == 5
+        column_bytes = 8 * len(f["2/idx"]) * len(q.data_vars)
+    pending = []
+
+    class Executor:
+        _max_workers = 2
+
+        def submit(self, func, *args):
+            pending.append(func(*args))
+            # two reads of IDs per worker, but no more steps than the write block
+            assert len(pending) <= (3 if func.__name__ == "_read_step" else 4)
+            return Future()
+
+    class Future:
+        def result(self):
+            return pending.pop(0)
+
+    store2 = str(tmp_path / "traj2.h5")
+    d.to_trajectories(
+        store2, species=[2], executor=Executor(), buffer_bytes=3 * column_bytes
+    )
+    with h5py.File(store2, "r") as f:
+        assert f["2/u"].chunks[1] == 3
+    assert np.allclose(
+        load(trajectories=store2).particles[2].u.values,
+        load(trajectories=store).particles[2].u.values,
+        equal_nan=True,
+    )
+
+
+def test_watch_pipeline(tmp_path):
+    import numpy as np
+    import shutil
+    from graphet.plugins import TristanV2
+    from graphet.watch import Pipeline
+
+    src = f"{fdir}/tests/data/tristanv2"
+    run = tmp_path / "run"
+    for sub in ["flds", "prtl", "spec"]:
+        (run / sub).mkdir(parents=True)
+
+    def land(steps):
+        for s in steps:
+            for sub in ["flds", "prtl", "spec"]:
+                shutil.copy(f"{src}/{sub}/{sub}.tot.{s:05d}", run / sub)
+
+    def pipeline():
+        pipe = Pipeline(
+            TristanV2,
+            str(tmp_path / "out"),
+            settle=0,
+            batch_size=2,
+            path=f"{run}/",
+            swapaxes=[(0, 1), (2, 1)],
+        )
+        pipe.reduction("energy", lambda d: (d.fields.bx**2).mean(["x", "y", "z"]))
+        return pipe
+
+    processed = []
+
+    def record(pipe):
+        process = pipe.process
+        pipe.process = lambda steps: processed.append(steps) or process(steps)
+        return pipe
+
+    land(range(3))
+    pipe = record(pipeline())
+    # freshly written files are not processed until they settle
+    idle = Pipeline(TristanV2, str(tmp_path / "idle"), settle=60, path=f"{run}/")
+    idle.reduction("energy", lambda d: d.fields.bx.mean(["x", "y", "z"]))
+    assert idle.pending() == []
+    pipe.run(once=True)
+    assert processed == [[0, 1], [2]]
+
+    # a restarted pipeline only processes the steps landed since
+    land(range(3, 5))
+    processed.clear()
+    pipe = record(pipeline())
+    pipe.reduction("spectrum", lambda d: d.spectra.n1)
+    pipe.run(once=True)
+    assert processed == [[0, 1], [2, 3], [4]]
+    processed.clear()
+    pipe.run(once=True)
+    assert processed == []
+
+    d = load()
+    energy = pipe.results("energy")
+    assert list(energy.step.values) == list(range(5))
+    assert np.allclose(energy.values, (d.fields.bx**2).mean(["x", "y", "z"]).values)
+    assert np.allclose(energy.t.values, d.fields.t.values)
+    # integer results do not truncate the times
+    counts = Pipeline(
+        TristanV2,
+        str(tmp_path / "counts"),
+        settle=0,
+        path=f"{run}/",
+        coord_transform={"t": lambda t, prm: 0.25 * t},
+    )
+    counts.reduction("count", lambda d: d.particles[2].x.count("idx"))
+    counts.run(once=True)
+    count = counts.results("count")
+    assert count.dtype.kind == "i"
+    assert np.all(count.values == d.particles[2].x.count("idx").values)
+    assert np.allclose(count.t.values, 0.25 * d.fields.t.values)
+    spectrum = pipe.results("spectrum")
+    assert spectrum.dims == d.spectra.n1.dims
+    assert np.allclose(spectrum.values, d.spectra.n1.values)
+
+    # the files of the processed steps are closed after each batch
+    fds = []
+    for i in range(3):
+        p = Pipeline(
+            TristanV2, str(tmp_path / f"fds{i}"), settle=0, batch_size=2, path=f"{run}/"
+        )
+        p.reduction("energy", lambda d: (d.fields.bx**2).mean(["x", "y", "z"]))
+        p.run(once=True)
+        assert len(p.done["energy"]) == 5
+        fds.append(len(os.listdir("/proc/self/fd")))
+    assert len(set(fds)) == 1
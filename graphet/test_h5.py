@@ -0,0 +1,63 @@
+def test_direct_chunk_reads(tmp_path):
+    from graphet.utils import DirectChunkDataset
+    import numpy as np
+    import pytest
+    import h5py
+
+    rng = np.random.default_rng(42)
+    data = rng.random((37, 50, 23))
+    with h5py.File(f"{tmp_path}/data.h5", "w") as f:
+        f.create_dataset("a", data=data, chunks=(8, 16, 8), compression="gzip")
+        f.create_dataset(
+            "b", data=data, chunks=(8, 16, 8), compression="gzip", shuffle=True
+        )
+        f.create_dataset("c", data=data, chunks=(8, 16, 8))
+        f.create_dataset("d", data=data)
+
+    with h5py.File(f"{tmp_path}/data.h5", "r") as f:
+        assert DirectChunkDataset.supports(f["a"]) and DirectChunkDataset.supports(
+            f["b"]
+        )
+        assert not DirectChunkDataset.supports(f["c"])
+        assert not DirectChunkDataset.supports(f["d"])
+        for k in ["a", "b"]:
+            ds = DirectChunkDataset(f[k])
+            for sel in [
+                (),
+                (slice(3, 30), slice(10, 45), slice(0, 23)),
+                (5, slice(None), slice(7, 9)),
+                (slice(1, 7), slice(2, 9), slice(1, 6)),
+                (slice(None), 49, -1),
+                (slice(10, 10),),
+            ]:
+                assert np.array_equal(ds[sel], data[sel])
+            assert np.array_equal(np.asarray(ds), data)
+            assert ds[1:3, 2:5, 0].flags.writeable
+            for sel in [(37, 0), (-38,), (0, 50, 0), (0, 0, -24)]:
+                with pytest.raises(IndexError):
+                    f[k][sel]
+                with pytest.raises(IndexError):
+                    ds[sel]
+            assert DirectChunkDataset(f[k], "float32")[()].dtype == np.float32
+
+
+def test_direct_engine(tmp_path):
+    from graphet.plugins import TristanV2
+    from graphet.utils import DirectChunkDataset
+    import numpy as np
+    import h5py
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    src = f"{fdir}/tests/data/tristanv2/"
+    os.makedirs(f"{tmp_path}/flds")
+    with h5py.File(f"{src}/flds/flds.tot.00000", "r") as f:
+        with h5py.File(f"{tmp_path}/flds/flds.tot.00000", "w") as c:
+            for k in f.keys():
+                c.create_dataset(k, data=f[k][()], chunks=(5, 10, 10), compression=4)
+
+    plugin = TristanV2(path=str(tmp_path), first_step=0, engine="direct")
+    plain = TristanV2(path=src, first_step=0)
+    arr = plugin.field("bx", 0)
+    assert any(isinstance(v, DirectChunkDataset) for v in dict(arr.dask).values())
+    assert np.array_equal(arr.compute(), plain.field("bx", 0).compute())
@@ -0,0 +1,88 @@
+import os
+
+fdir = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_slice_server():
+    from graphet.server import SliceServer
+    from graphet.plugins import TristanV2
+    from graphet import Data
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+    import numpy as np
+    import threading
+    import gzip
+    import json
+    import io
+
+    d = Data(
+        TristanV2,
+        steps=TristanV2(path=f"{fdir}/tests/data/tristanv2/").availableSteps(),
+        path=f"{fdir}/tests/data/tristanv2/",
+        first_step=0,
+        particles=None,
+    )
+    assert list(d.steps) == [0, 1, 2, 3, 4]
+    server = SliceServer(d, port=0, tile_size=8)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.address
+
+    def get(path, **headers):
+        with urlopen(Request(f"http://{host}:{port}{path}", headers=headers)) as r:
+            return r.status, dict(r.headers), r.read()
+
+    try:
+        _, _, body = get("/meta")
+        meta = json.loads(body)
+        assert meta["steps"] == [0, 1, 2, 3, 4]
+        assert "bx" in meta["fields"] and "n2" in meta["spectra"]
+
+        z = meta["fields_coords"]["z"][3]
+        expected = d.fields.bx.isel(t=2).sel(z=z).values
+        status, headers, body = get(
+            f"/field/bx?step=2&z={z}", **{"Accept-Encoding": "gzip"}
+        )
+        assert status == 200 and headers["Content-Encoding"] == "gzip"
+        assert np.all(np.load(io.BytesIO(gzip.decompress(body))) == expected)
+        assert server.cache.stats["misses"] == 2
+
+        # cached responses support range requests
+        status, headers, part = get(
+            f"/field/bx?step=2&z={z}",
+            **{"Accept-Encoding": "gzip", "Range": "bytes=10-19"},
+        )
+        assert status == 206 and part == body[10:20]
+        assert headers["Content-Range"] == f"bytes 10-19/{len(body)}"
+        assert server.cache.stats["hits"] == 1
+
+        _, _, body = get(f"/tile/bx?step=2&z={z}&level=1&tx=0&ty=0")
+        tile = np.load(io.BytesIO(body))
+        assert tile.shape == (8, 8)
+        assert np.allclose(
+            tile, expected[:16, :16].reshape(8, 2, 8, 2).mean(axis=(1, 3))
+        )
+
+        _, headers, png = get(f"/field/bx?t={d.times[1]}&z={z}&format=png")
+        assert (
+            headers["Content-Type"] == "image/png" and png[:8] == b"\x89PNG\r\n\x1a\n"
+        )
+
+        _, _, body = get(f"/spectrum/n2?step=3")
+        assert np.all(np.load(io.BytesIO(body)) == d.spectra.n2.isel(t=3).values)
+
+        for path, code in [
+            ("/field/bx?step=2", 400),
+            ("/field/nope?step=2", 404),
+            (f"/tile/bx?step=2&z={z}&level=-1", 400),
+            (f"/tile/bx?step=2&z={z}&level=one", 400),
+            (f"/tile/bx?step=2&z={z}&tx=-1", 400),
+            (f"/tile/bx?step=2&z={z}&tx=100", 404),
+            (f"/field/bx?step=2&z={z}&stride=0", 400),
+        ]:
+            try:
+                get(path)
+                assert False
+            except HTTPError as e:
+                assert e.code == code
+    finally:
+        server.shutdown()
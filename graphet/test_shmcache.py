@@ -0,0 +1,75 @@
+def test_shared_cache(monkeypatch):
+    from graphet.shmcache import serve, SharedCacheClient
+    from graphet.plugins import TristanV2
+    import multiprocessing
+    import numpy as np
+    import socket
+    import pytest
+    import pickle
+    import secrets
+    import time
+    import os
+
+    monkeypatch.delenv("GRAPHET_SHM_AUTHKEY", raising=False)
+    with pytest.raises(ValueError, match="GRAPHET_SHM_AUTHKEY"):
+        SharedCacheClient("127.0.0.1:5577")
+    # the service and the clients (including the spawned service) read the key from the environment
+    monkeypatch.setenv("GRAPHET_SHM_AUTHKEY", secrets.token_hex(16))
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    address = f"127.0.0.1:{port}"
+    service = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(address, 4000), daemon=True
+    )
+    service.start()
+    try:
+        client = SharedCacheClient(address)
+        for _ in range(50):
+            try:
+                client.stats()
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.1)
+
+        a = np.arange(100, dtype=np.float64)
+        assert client.get("a") is None
+        client.put("a", a)
+        view = pickle.loads(pickle.dumps(client)).get("a")
+        assert np.all(view == a) and not view.flags.writeable
+        # least recently used chunks are evicted to fit the budget
+        for k in "bcdef":
+            client.put(k, a)
+        assert client.get("a") is None
+        assert client.stats()["bytes"] <= 4000
+        assert np.all(view == a)
+        client.clear()
+
+        fdir = os.path.dirname(os.path.abspath(__file__))
+        plugin = TristanV2(
+            path=f"{fdir}/tests/data/tristanv2/", first_step=0, shm_cache=address
+        )
+        bx = plugin.field("bx", 1).compute()
+        hits = client.stats()["hits"]
+        assert np.all(plugin.field("bx", 1).compute() == bx)
+        assert client.stats()["hits"] > hits
+    finally:
+        service.terminate()
+
+
+def test_stale_reservations():
+    from graphet.shmcache import CacheIndex
+    import time
+
+    index = CacheIndex(1000, pending_timeout=0.05)
+    first = index.reserve("a", 100)
+    assert first is not None and index.reserve("a", 100) is None
+    # the client holding the reservation died before committing it
+    time.sleep(0.1)
+    second = index.reserve("a", 100)
+    assert second is not None and second != first
+    assert index.stats()["bytes"] == 100
+    index.commit("a", (25,), "<f4")
+    assert index.lookup("a") == (second, (25,), "<f4")
+    index.clear()
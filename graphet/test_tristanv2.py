@@ -127,3 +127,185 @@ def test_tristanv2_plugin():
     assert np.all(np.isclose(d.spectra.e, ebins_mid))
     for i in range(1, 5):
         assert d.spectra[f"n{i}"].shape == (5, 100)
+
+
+def test_tristanv2_split_output(tmp_path):
+    from graphet.plugins import TristanV2
+    from graphet import Data
+    import numpy as np
+    import pytest
+    import shutil
+    import h5py
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    src = f"{fdir}/tests/data/tristanv2/"
+    shutil.copytree(f"{src}/spec", f"{tmp_path}/spec")
+    for data in ["flds", "prtl"]:
+        os.makedirs(f"{tmp_path}/{data}")
+        for step in range(5):
+            fname = f"{data}/{data}.tot.{step:05d}"
+            with h5py.File(f"{src}/{fname}", "r") as f:
+                for piece in range(3):
+                    with h5py.File(f"{tmp_path}/{fname}.{piece:03d}", "w") as p:
+                        for k in f.keys():
+                            n = f[k].shape[0]
+                            p.create_dataset(
+                                k, data=f[k][piece * n // 3 : (piece + 1) * n // 3]
+                            )
+
+    kwargs = dict(steps=range(5), first_step=0, swapaxes=[(0, 1), (2, 1)])
+    d = Data(TristanV2, path=src, **kwargs)
+    d_split = Data(TristanV2, path=str(tmp_path), **kwargs)
+    assert len(d_split.plugin.sourceFiles([0])) == 7
+    for f in ["bx", "by", "bz", "xx"]:
+        assert np.all(d.fields[f].values == d_split.fields[f].values)
+    # chunks do not cross file boundaries (first axis on disk: 25 -> 8 + 8 + 9)
+    assert np.all(
+        np.isin([8, 16], np.cumsum(d_split.plugin.readField("bx", 0).chunks[0]))
+    )
+    for sp in d.particles.keys():
+        for k in d.particles[sp].variables.keys():
+            assert np.allclose(
+                d.particles[sp][k].values,
+                d_split.particles[sp][k].values,
+                equal_nan=True,
+            )
+
+    # pieces which do not tile the first axis are rejected
+    d_split.plugin.close()
+    with h5py.File(f"{tmp_path}/flds/flds.tot.00001.001", "a") as p:
+        bx = p["bx"][()]
+        del p["bx"]
+        p.create_dataset("bx", data=bx[:, 1:])
+        del p["by"]
+    plugin = TristanV2(path=str(tmp_path), first_step=0)
+    with pytest.raises(ValueError):
+        plugin.readField("bx", 1)
+    with pytest.raises(ValueError):
+        plugin.readField("by", 1)
+    assert plugin.readField("bz", 1).shape == d.plugin.readField("bz", 1).shape
+
+
+def test_tristanv2_prtl_index(tmp_path):
+    from graphet.plugins import TristanV2
+    import numpy as np
+    import shutil
+    import h5py
+    import glob
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    kwargs = dict(path=f"{fdir}/tests/data/tristanv2/", first_step=0)
+    plugin = TristanV2(index_cache=str(tmp_path), **kwargs)
+    ids = plugin.prtlIndex(2, 3)
+    ind = plugin.readParticleKey(2, "ind", 3)[:]
+    proc = plugin.readParticleKey(2, "proc", 3)[:]
+    assert ids.dtype == np.int64
+    assert np.all(ids == np.ravel_multi_index([ind, proc], [100000000, 100000000]))
+    assert plugin.prtlIndex(2, 3) is ids
+    (sidecar,) = glob.glob(f"{tmp_path}/prtl.idx.2.00003.*.npz")
+
+    plugin = TristanV2(index_cache=str(tmp_path), **kwargs)
+    plugin.readParticleKey = None
+    assert np.all(plugin.prtlIndex(2, 3) == ids)
+
+    # another run sharing the cache gets its own sidecars
+    other = tmp_path / "other"
+    shutil.copytree(f"{fdir}/tests/data/tristanv2/prtl", other / "prtl")
+    with h5py.File(other / "prtl/prtl.tot.00003", "a") as f:
+        f["ind_2"][...] = f["ind_2"][...] + 1
+    plugin = TristanV2(path=f"{other}/", first_step=0, index_cache=str(tmp_path))
+    assert np.all(plugin.prtlIndex(2, 3) == ids + 100000000)
+    # sidecars of modified particle files are not used
+    plugin.close()
+    with h5py.File(other / "prtl/prtl.tot.00003", "a") as f:
+        f["ind_2"][...] = f["ind_2"][...] + 1
+    plugin = TristanV2(path=f"{other}/", first_step=0, index_cache=str(tmp_path))
+    assert np.all(plugin.prtlIndex(2, 3) == ids + 200000000)
+    assert len(glob.glob(f"{tmp_path}/prtl.idx.2.00003.*.npz")) == 2
+
+
+def test_tristanv2_selection():
+    from graphet.plugins import TristanV2
+    from graphet import Data
+    import pytest
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    d = Data(
+        TristanV2,
+        steps=range(5),
+        path=f"{fdir}/tests/data/tristanv2/",
+        first_step=0,
+        fields=["b[xy]", "zz"],
+        particles=[2, 3, "x", "u*"],
+        spectra=["n[12]"],
+    )
+    assert sorted(d.fields.data_vars.keys()) == ["bx", "by", "zz"]
+    assert list(d.particles.keys()) == [2, 3]
+    assert sorted(d.particles[2].data_vars.keys()) == ["u", "x"]
+    assert sorted(d.particles[3].data_vars.keys()) == ["x"]
+    assert sorted(d.spectra.data_vars.keys()) == ["n1", "n2"]
+
+    with pytest.raises(ValueError):
+        TristanV2(
+            path=f"{fdir}/tests/data/tristanv2/", first_step=0, fields=["bw"]
+        ).fieldKeys()
+
+
+def test_tristanv2_spatial_spectra(tmp_path):
+    from graphet.plugins import TristanV2
+    from graphet import Data
+    import dask.config
+    import numpy as np
+    import shutil
+    import h5py
+    import os
+
+    fdir = os.path.dirname(os.path.abspath(__file__))
+    src = f"{fdir}/tests/data/tristanv2/"
+    shutil.copytree(f"{src}/flds", f"{tmp_path}/flds")
+    os.makedirs(f"{tmp_path}/spec")
+    rng = np.random.default_rng(0)
+    raw = {}
+    for step in range(5):
+        fname = f"spec/spec.tot.{step:05d}"
+        with h5py.File(f"{src}/{fname}", "r") as f:
+            with h5py.File(f"{tmp_path}/{fname}", "w") as s:
+                for k in f.keys():
+                    s.create_dataset(k, data=f[k][()])
+                # `n1` is binned in y and x, stored as (e, z, y, x)
+                raw[step] = rng.integers(0, 100, size=(100, 1, 3, 4))
+                del s["n1"]
+                s.create_dataset("n1", data=raw[step])
+                s.create_dataset("xbins", data=np.arange(4) * 10.0)
+                s.create_dataset("ybins", data=np.arange(3) * 10.0)
+                s.create_dataset("zbins", data=np.zeros(1))
+
+    kwargs = dict(
+        steps=range(5),
+        path=str(tmp_path),
+        first_step=0,
+        particles=None,
+        coord_transform={"x": lambda x, prm: x / 10},
+    )
+    with dask.config.set({"array.chunk-size": "2KiB"}):
+        d = Data(TristanV2, eager_bytes=0, **kwargs)
+    d_eager = Data(TristanV2, **kwargs)
+    for dd in [d, d_eager]:
+        assert dd.spectra.n1.dims == ("t", "e", "y", "x")
+        assert dd.spectra.n2.dims == ("t", "e")
+        assert np.all(dd.spectra.n1.x.values == np.arange(4))
+        assert np.all(dd.spectra.n1.y.values == np.arange(3) * 10)
+        assert np.all(
+            dd.spectra.n1.values == np.stack([raw[s][:, 0] for s in range(5)])
+        )
+        assert np.all(
+            dd.spectra.n1.sum(["x", "y"]).values
+            == np.stack([raw[s].sum(axis=(1, 2, 3)) for s in range(5)])
+        )
+    # a region of the box is read alone
+    local = d.spectra.n1.sel(x=slice(1, 2))
+    assert d.estimate(local)["read_bytes"] < d.estimate(d.spectra.n1)["read_bytes"]
+    assert np.all(local.values == d_eager.spectra.n1.sel(x=slice(1, 2)).values)
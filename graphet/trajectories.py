@@ -0,0 +1,263 @@
+from typing import Any, Dict, List, Tuple
+
+SKIPPED_KEYS = ["ind", "proc"]
+
+
+def _read_ids(plugin: Any, species: int, step: int) -> Any:
+    ids = plugin.prtlIndex(species, step)
+    if ids is None:
+        raise ValueError(
+            f"{type(plugin).__name__} does not provide particle IDs, required for a trajectory store"
+        )
+    return ids
+
+
+def _read_step(
+    plugin: Any, species: int, keys: List[str], step: int
+) -> Tuple[int, Any, Dict[str, Any]]:
+    import numpy as np
+
+    ids = _read_ids(plugin, species, step)
+    return (
+        step,
+        ids,
+        {k: np.asarray(plugin.particleKey(species, k, step)) for k in keys},
+    )
+
+
+def _executor_workers(executor: Any) -> int:
+    import os
+
+    if hasattr(executor, "nthreads"):
+        return max(1, sum(executor.nthreads().values()))
+    return getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+
+
+def _bounded_map(executor: Any, func: Any, args: List[tuple], inflight: int) -> Any:
+    """
+    Run `func` over the arguments on the executor with at most `inflight` calls pending, yielding the results in order.
+    """
+    from collections import deque
+
+    pending = deque()
+    for a in args:
+        pending.append(executor.submit(func, *a))
+        if len(pending) >= inflight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def build_trajectories(
+    plugin: Any,
+    path: str,
+    steps: List[int],
+    species: List[int] | None = None,
+    keys: List[str] | None = None,
+    chunk_bytes: int = 4 * 1000**2,
+    buffer_bytes: int = 256 * 1000**2,
+    executor: Any = None,
+) -> str:
+    """
+    Convert step-major particle outputs into a particle-major trajectory store: an HDF5 file with a group per species, holding the sorted packed particle IDs (`idx`) and a `(len(idx), len(steps))` dataset per particle key, chunked by ranges of IDs and blocks of steps. Particles missing at a step are `NaN`.
+
+    The steps are read in parallel and written a block of steps at a time, so every write fills whole chunks. The block is as many steps as fit in `buffer_bytes` for all the keys of a species, which also bounds the steps read ahead (at most two per worker); the layout of the store therefore only depends on the data, not on the machine converting it. The steps already written are recorded in the store, so an interrupted conversion can be resumed by running it again.
+
+    Parameters
+    ----------
+    `plugin` : `Plugin`
+        the data reading plugin (its `coord_transform` and `swapaxes` are applied to the stored values)
+    `path` : `str`
+        the path of the store
+    `steps` : `List[int]`
+        the steps to convert
+    `species` : `List[int]`, optional
+        the particle species (default: all species selected by the plugin)
+    `keys` : `List[str]`, optional
+        the particle keys (default: all keys selected by the plugin, except `ind` and `proc`, which make the IDs)
+    `chunk_bytes` : `int`, optional
+        target size of the chunks of the store (default: 4 MB)
+    `buffer_bytes` : `int`, optional
+        memory budget of the block of steps buffered before being written (default: 256 MB)
+    `executor` : `concurrent.futures.Executor | Client | Dashboard`, optional
+        where to read the steps (default: a thread pool; process pools require the plugin to be pickleable)
+
+    Returns
+    -------
+    `str`
+        the path of the store
+
+    Raises
+    ------
+    `ValueError`
+        if the store was started for different steps, or the plugin does not provide particle IDs
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from .utils import close_h5
+    import numpy as np
+    import h5py
+
+    steps = [int(s) for s in steps]
+    if species is None:
+        species = plugin.prtlSpecies()
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor()
+    elif hasattr(executor, "client"):
+        executor = executor.client
+    workers = _executor_workers(executor)
+    try:
+        # read-only handles of a store being resumed must be closed before writing
+        close_h5(path)
+        with h5py.File(path, "a") as store:
+            if "steps" in store.attrs:
+                if list(store.attrs["steps"]) != steps:
+                    raise ValueError(
+                        f"Store `{path}` was started for different steps; remove it or convert the same steps"
+                    )
+            else:
+                store.attrs["steps"] = np.array(steps, dtype=np.int64)
+
+            for sp in species:
+                sp_keys = [
+                    k
+                    for k in (plugin.prtlKeys(sp) if keys is None else keys)
+                    if k not in SKIPPED_KEYS
+                ]
+                group = store.require_group(str(sp))
+                if "idx" not in group:
+                    # the IDs of all the particles ever present
+                    ids = list(
+                        _bounded_map(
+                            executor,
+                            _read_ids,
+                            [(plugin, sp, s) for s in steps],
+                            2 * workers,
+                        )
+                    )
+                    idx = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + ids))
+                    del ids
+                    group.create_dataset("done", data=np.zeros(len(steps), dtype=bool))
+                    # steps per chunk, and per write
+                    column_bytes = 8 * max(1, len(idx)) * max(1, len(sp_keys))
+                    group.attrs["block"] = max(
+                        1, min(len(steps), buffer_bytes // column_bytes)
+                    )
+                    # `idx` is written last: its presence marks an initialized group
+                    group.create_dataset("idx", data=idx)
+                idx = group["idx"][()]
+                done = group["done"]
+                block = int(group.attrs["block"])
+                inflight = max(1, min(2 * workers, block))
+                nrows = max(1, int(chunk_bytes // (8 * block)))
+                chunks = (max(1, min(nrows, len(idx))), block)
+
+                todo = [c for c, d in enumerate(done[()]) if not d]
+                # columns of the block being assembled, and their values per key
+                cols, slab = [], {}
+
+                def write(cols: List[int], slab: Dict[str, Any]) -> None:
+                    lo, hi = cols[0] // block * block, cols[-1] + 1
+                    for k, v in slab.items():
+                        if k not in group:
+                            group.create_dataset(
+                                k,
+                                shape=(len(idx), len(steps)),
+                                dtype=v.dtype,
+                                chunks=chunks,
+                                fillvalue=np.nan,
+                            )
+                        if hi - lo == len(cols):
+                            group[k][:, lo:hi] = v
+                        else:
+                            # a partially converted block of a resumed store
+                            values = group[k][:, lo:hi]
+                            values[:, np.array(cols) - lo] = v
+                            group[k][:, lo:hi] = values
+                    for c in cols:
+                        done[c] = True
+                    store.flush()
+
+                results = _bounded_map(
+                    executor,
+                    _read_step,
+                    [(plugin, sp, sp_keys, steps[c]) for c in todo],
+                    inflight,
+                )
+                for n, (step, ids, values) in enumerate(results):
+                    pos = np.searchsorted(idx, ids)
+                    if len(ids) and (pos.max() >= len(idx) or np.any(idx[pos] != ids)):
+                        raise ValueError(
+                            f"Particle IDs of species {sp} at step {step} changed since the store was started"
+                        )
+                    col = todo[n]
+                    for k, v in values.items():
+                        if k not in slab:
+                            dtype = v.dtype if v.dtype.kind == "f" else np.float64
+                            width = min(block, len(steps) - col // block * block)
+                            slab[k] = np.full((len(idx), width), np.nan, dtype=dtype)
+                        slab[k][pos, len(cols)] = v
+                    cols.append(col)
+                    last = n + 1 == len(todo) or todo[n + 1] // block != col // block
+                    if last:
+                        write(cols, {k: v[:, : len(cols)] for k, v in slab.items()})
+                        cols, slab = [], {}
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return path
+
+
+def read_trajectories(path: str, steps: List[int]) -> Dict[int, Any]:
+    """
+    Lazily read a trajectory store (see `build_trajectories`).
+
+    Parameters
+    ----------
+    `path` : `str`
+        the path of the store
+    `steps` : `List[int]`
+        the steps to read
+
+    Returns
+    -------
+    `Dict[int, Dict[str, da.Array]]`
+        for each species, the sorted particle IDs (`"idx"`, a numpy array) and the particle keys with dimensions `(idx, t)`
+
+    Raises
+    ------
+    `ValueError`
+        if some of the steps are missing from the store, or have not been converted yet
+    """
+    from dask.array.core import from_array as da_from_array
+    from .utils import open_h5
+    import numpy as np
+
+    store = open_h5(path)
+    stored = list(store.attrs["steps"])
+    missing = [s for s in steps if s not in stored]
+    if missing:
+        raise ValueError(f"Steps {missing} are not in the trajectory store `{path}`")
+    cols = [stored.index(s) for s in steps]
+    species = {}
+    for sp, group in store.items():
+        if "idx" not in group:
+            continue
+        pending = [s for s, c in zip(steps, cols) if not group["done"][c]]
+        if pending:
+            raise ValueError(
+                f"Steps {pending} of species {sp} are not converted yet; resume the conversion of `{path}`"
+            )
+        data = {"idx": group["idx"][()]}
+        for k, ds in group.items():
+            if k not in ["idx", "done"]:
+                arr = da_from_array(ds, chunks=ds.chunks)
+                contiguous = cols == list(range(cols[0], cols[0] + len(cols)))
+                data[k] = (
+                    arr[:, cols[0] : cols[0] + len(cols)]
+                    if contiguous
+                    else arr[:, np.array(cols)]
+                )
+        species[int(sp)] = data
+    return species
@@ -1,2 +1,10 @@
 from .typing import array_t
 from .fmt import sizeof_fmt
+from .h5 import (
+    CastDataset,
+    DirectChunkDataset,
+    close_h5,
+    open_h5,
+    prewarm_handles,
+    set_handle_cache_size,
+)
@@ -0,0 +1,302 @@
+from typing import Any, Dict, List
+import h5pickle
+
+
+def set_handle_cache_size(maxsize: float) -> None:
+    """
+    Resize the per-process cache of open HDF5 file handles (kept by `h5pickle`, 100 files by default). The files opened by plugins are not kept there; the cache serves the files reopened by process-based workers (see the `Dashboard` profiles). Handles already in the cache are carried over (the least recently used ones are closed if they do not fit).
+
+    Parameters
+    ----------
+    `maxsize` : `float`
+        maximum number of simultaneously open files (`math.inf` for unbounded)
+    """
+    cache = h5pickle.LRUFileCache(maxsize)
+    for key, handle in list(h5pickle.cache.items()):
+        cache[key] = handle
+    h5pickle.cache = cache
+
+
+class OwnedFile(h5pickle.File):
+    """
+    HDF5 file opened outside of the per-process handle cache, so it is closed with its last reference (or explicitly) rather than by cache eviction. Once pickled, it is reopened through the handle cache of the receiving process.
+    """
+
+    def __getnewargs_ex__(self):
+        return self.init_args, self.init_kwargs
+
+
+def open_h5(fname: str, handles: Dict[str, Any] | None = None):
+    """
+    Open an HDF5 file for reading. The returned file (and the datasets taken from it) can be pickled, so dask graphs built from them can be shipped to process-based workers, which then reopen the file from their own handle cache.
+
+    Parameters
+    ----------
+    `fname` : `str`
+        path to the file
+    `handles` : `Dict[str, Any]`, optional
+        handles owned by the caller (e.g., a plugin) to open the file into: the file then stays open as long as it is referenced, regardless of the size of the per-process handle cache (default: `None`, open the file through the per-process handle cache)
+
+    Returns
+    -------
+    `h5pickle.File`
+        the opened file
+    """
+    if handles is None:
+        return h5pickle.File(fname, "r")
+    if fname not in handles or not handles[fname].id.valid:
+        handles[fname] = OwnedFile(fname, "r", skip_cache=True)
+    return handles[fname]
+
+
+def close_h5(fname: str, handles: Dict[str, Any] | None = None) -> None:
+    """
+    Close the handles of a file (e.g., before writing to it). Datasets taken from these handles can no longer be read.
+
+    Parameters
+    ----------
+    `fname` : `str`
+        path to the file
+    `handles` : `Dict[str, Any]`, optional
+        handles owned by the caller to close the file in (default: `None`, close it in the per-process handle cache)
+    """
+    import os
+
+    if handles is not None:
+        handle = handles.pop(fname, None)
+        if handle is not None and handle.id.valid:
+            handle.close()
+        return
+    for key, handle in list(h5pickle.cache.items()):
+        args = getattr(handle, "init_args", ())
+        if args and os.path.abspath(str(args[0])) == os.path.abspath(fname):
+            del h5pickle.cache[key]
+            handle.close()
+
+
+def prewarm_handles(fnames: List[str]) -> None:
+    """
+    Open the given files in the handle cache of the current process, so the first tasks reading them do not pay for opening them.
+
+    Parameters
+    ----------
+    `fnames` : `List[str]`
+        paths to the files
+    """
+    import os
+
+    for fname in fnames:
+        if os.path.exists(fname):
+            open_h5(fname)
+
+
+class CastDataset:
+    def __init__(self, ds, dtype):
+        """
+        Array-like view of an HDF5 dataset converting its values to another dtype while reading, so the data never exists in memory in the original precision.
+
+        Parameters
+        ----------
+        `ds` : `h5py.Dataset`
+            the dataset
+        `dtype` : `np.dtype`
+            the dtype to convert to
+        """
+        import numpy as np
+
+        self.ds = ds
+        self.dtype = np.dtype(dtype)
+        self.shape = ds.shape
+        self.ndim = ds.ndim
+        self.chunks = ds.chunks
+
+    def __getitem__(self, sel):
+        return self.ds.astype(self.dtype)[sel]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[()]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __len__(self) -> int:
+        return len(self.ds)
+
+
+_decompression_pool = None
+
+
+def decompression_pool():
+    """
+    Thread pool shared by all `DirectChunkDataset` reads of the current process.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import os
+
+    global _decompression_pool
+    if _decompression_pool is None:
+        _decompression_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+    return _decompression_pool
+
+
+class DirectChunkDataset:
+    def __init__(self, ds, dtype=None):
+        """
+        Array-like view of a chunked and compressed HDF5 dataset, which reads the raw compressed chunks (a cheap operation under the h5py lock) and decompresses them in a thread pool, where `zlib` runs without holding the GIL. Only the `deflate` (gzip) and `shuffle` filters are supported, see `DirectChunkDataset.supports`.
+
+        Parameters
+        ----------
+        `ds` : `h5py.Dataset`
+            the dataset
+        `dtype` : `np.dtype`, optional
+            the dtype to convert the values to (default: `None`, keep the dtype of the dataset)
+        """
+        import numpy as np
+
+        assert DirectChunkDataset.supports(ds), f"{ds.name} cannot be read directly"
+        self.ds = ds
+        self.dtype = np.dtype(dtype if dtype is not None else ds.dtype)
+        self.shape = ds.shape
+        self.ndim = ds.ndim
+        self.chunks = ds.chunks
+        plist = ds.id.get_create_plist()
+        self.filters = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+
+    @staticmethod
+    def supports(ds) -> bool:
+        """
+        Check whether a dataset is chunked, compressed, and only uses the supported filters.
+        """
+        import h5py
+
+        if ds.chunks is None or ds.dtype.kind not in "biuf":
+            return False
+        plist = ds.id.get_create_plist()
+        filters = [plist.get_filter(i)[0] for i in range(plist.get_nfilters())]
+        return h5py.h5z.FILTER_DEFLATE in filters and all(
+            f in (h5py.h5z.FILTER_DEFLATE, h5py.h5z.FILTER_SHUFFLE) for f in filters
+        )
+
+    def decode(self, raw: bytes, mask: int):
+        import zlib
+        import h5py
+        import numpy as np
+
+        dtype = self.ds.dtype
+        # filters are undone in the reverse order; bit `i` of the mask marks filter `i` as skipped
+        buf = raw
+        for i in reversed(range(len(self.filters))):
+            if mask & (1 << i):
+                continue
+            if self.filters[i] == h5py.h5z.FILTER_DEFLATE:
+                buf = zlib.decompress(buf)
+            elif self.filters[i] == h5py.h5z.FILTER_SHUFFLE and dtype.itemsize > 1:
+                buf = np.ascontiguousarray(
+                    np.frombuffer(buf, dtype=np.uint8).reshape(dtype.itemsize, -1).T
+                )
+        if isinstance(buf, bytes):
+            # `zlib` returns immutable bytes: take a single writable copy
+            buf = bytearray(buf)
+        # the chunk owns its (freshly decoded) memory, so it can be returned as is
+        return np.frombuffer(buf, dtype=np.uint8).view(dtype).reshape(self.chunks)
+
+    def readChunk(self, offset: tuple):
+        import numpy as np
+
+        info = self.ds.id.get_chunk_info_by_coord(offset)
+        if info.byte_offset is None:
+            return None, np.full(self.chunks, self.ds.fillvalue, dtype=self.ds.dtype)
+        mask, raw = self.ds.id.read_direct_chunk(offset)
+        return decompression_pool().submit(self.decode, raw, mask), None
+
+    def __getitem__(self, sel):
+        import itertools
+        import numpy as np
+
+        if not isinstance(sel, tuple):
+            sel = (sel,)
+        if Ellipsis in sel or len(sel) > self.ndim:
+            return self.ds[sel].astype(self.dtype)
+        sel = sel + (slice(None),) * (self.ndim - len(sel))
+        bounds, squeeze = [], []
+        for s, n in zip(sel, self.shape):
+            if isinstance(s, (int, np.integer)):
+                if not -n <= s < n:
+                    raise IndexError(f"Index ({s}) out of range for (0-{n - 1})")
+                s = int(s) + n if s < 0 else int(s)
+                bounds.append((s, s + 1))
+                squeeze.append(True)
+            elif isinstance(s, slice) and s.step in (None, 1):
+                start, stop, _ = s.indices(n)
+                bounds.append((start, max(start, stop)))
+                squeeze.append(False)
+            else:
+                # fancy indexing is left to h5py
+                return self.ds[sel].astype(self.dtype)
+        out_shape = tuple(b - a for a, b in bounds)
+        if any(n == 0 for n in out_shape):
+            out = np.empty(out_shape, dtype=self.dtype)
+            return out[tuple(0 if sq else slice(None) for sq in squeeze)]
+
+        ranges = [range(a // c * c, b, c) for (a, b), c in zip(bounds, self.chunks)]
+        offsets = list(itertools.product(*ranges))
+        reads = [self.readChunk(o) for o in offsets]
+
+        def region(offset):
+            src, dst = [], []
+            for o, (a, b), c in zip(offset, bounds, self.chunks):
+                lo, hi = max(a, o), min(b, o + c)
+                src.append(slice(lo - o, hi - o))
+                dst.append(slice(lo - a, hi - a))
+            return tuple(src), tuple(dst)
+
+        if len(offsets) == 1 and self.dtype == self.ds.dtype:
+            # selection within a single chunk: a view of the decoded chunk, which is private
+            # to this read (and the chunk itself when the whole chunk is selected)
+            future, chunk = reads[0]
+            chunk = chunk if future is None else future.result()
+            out = chunk[region(offsets[0])[0]]
+        else:
+            out = np.empty(out_shape, dtype=self.dtype)
+            for offset, (future, chunk) in zip(offsets, reads):
+                chunk = chunk if future is None else future.result()
+                src, dst = region(offset)
+                out[dst] = chunk[src]
+        return out[tuple(0 if sq else slice(None) for sq in squeeze)]
+
+    def __array__(self, dtype=None, copy=None):
+        arr = self[()]
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __len__(self) -> int:
+        return len(self.ds)
+
+
+def _normalize_h5_dataset(ds) -> tuple:
+    import os
+
+    # tokenize datasets by their location and the modification time of the file, so that graphs
+    # built from the same files in different sessions get the same (reproducible) names
+    fname = ds.file.filename
+    return (
+        "h5py.Dataset",
+        fname,
+        ds.name,
+        ds.shape,
+        str(ds.dtype),
+        os.stat(fname).st_mtime_ns,
+    )
+
+
+def _register_tokenizer() -> None:
+    from dask.base import normalize_token
+    import h5py
+
+    normalize_token.register(h5py.Dataset)(_normalize_h5_dataset)
+    normalize_token.register(DirectChunkDataset)(
+        lambda c: ("DirectChunkDataset", _normalize_h5_dataset(c.ds), str(c.dtype))
+    )
+    normalize_token.register(CastDataset)(
+        lambda c: ("CastDataset", _normalize_h5_dataset(c.ds), str(c.dtype))
+    )
+
+
+_register_tokenizer()
@@ -0,0 +1,278 @@
+from typing import Any, Callable, Dict, List, Type
+from .plugin import Plugin
+
+
+class Pipeline:
+    def __init__(
+        self,
+        plugin: Type[Plugin],
+        outdir: str,
+        settle: float = 10.0,
+        batch_size: int = 8,
+        scheduler: Any = "threads",
+        **kwargs,
+    ):
+        """
+        Streaming analysis of a running simulation: registered reductions are computed for every new step as soon as its files are complete, and their results are appended to an on-disk store. The progress is checkpointed after every batch of steps, so a restarted pipeline resumes where it left off (and a newly registered reduction catches up on the steps it missed).
+
+        Parameters
+        ----------
+        `plugin` : `Plugin`
+            the data reading plugin to use
+        `outdir` : `str`
+            directory of the results (`results.h5`) and of the checkpoint (`checkpoint.json`)
+        `settle` : `float`, optional
+            a step is processed once all its files exist, can be opened, and have not been modified for this many seconds (default: `10`)
+        `batch_size` : `int`, optional
+            maximum number of steps processed at once (default: `8`)
+        `scheduler` : `str | Client | Dashboard`, optional
+            where to compute the reductions, the steps of a batch and the reductions being computed in parallel (default: `"threads"`, the local thread pool)
+        `**kwargs` : `Dict[str, Any]`
+            the keyword arguments to pass to `Data` and the plugin (e.g., `path`, `cfg_fname`, `coord_transform`)
+
+        Example
+        -------
+        ```
+        pipe = Pipeline(TristanV2, "analysis/", path="output/")
+
+        @pipe.reduction("magnetic_energy")
+        def magnetic_energy(d):
+            return (d.fields.bx**2 + d.fields.by**2 + d.fields.bz**2).mean(["x", "y", "z"])
+
+        pipe.run(poll=30)
+        ```
+        """
+        import os
+
+        self.plugin = plugin
+        self.outdir = outdir
+        self.settle = settle
+        self.batch_size = max(1, batch_size)
+        self.scheduler = getattr(scheduler, "client", scheduler)
+        self.kwargs = kwargs
+        self.reductions: Dict[str, Callable[[Any], Any]] = {}
+        self.store = os.path.join(outdir, "results.h5")
+        self.checkpoint = os.path.join(outdir, "checkpoint.json")
+        os.makedirs(outdir, exist_ok=True)
+        self.done: Dict[str, List[int]] = self.readCheckpoint()
+
+    def reduction(self, name: str, func: Callable[[Any], Any] | None = None) -> Any:
+        """
+        Register a reduction, either directly or as a decorator.
+
+        Parameters
+        ----------
+        `name` : `str`
+            the name of the results
+        `func` : `Callable[[Data], xr.DataArray]`, optional
+            function of a data container holding the new steps, returning a lazy array with the dimension `t` (and any other dimensions, e.g., for spectra)
+
+        Returns
+        -------
+        `Callable`
+            the function (or the decorator registering it)
+        """
+        if func is None:
+            return lambda f: self.reduction(name, f)
+        self.reductions[name] = func
+        self.done.setdefault(name, [])
+        return func
+
+    def readCheckpoint(self) -> Dict[str, List[int]]:
+        import json
+        import os
+
+        if not os.path.exists(self.checkpoint):
+            return {}
+        with open(self.checkpoint) as f:
+            return {k: list(v) for k, v in json.load(f).items()}
+
+    def writeCheckpoint(self) -> None:
+        import json
+        import os
+
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.done, f)
+        os.replace(tmp, self.checkpoint)
+
+    def ready(self, step: int, plugin: Plugin) -> bool:
+        """
+        Whether all the files of a step are completely written.
+        """
+        import time
+        import h5py
+        import os
+
+        fnames = plugin.sourceFiles([step])
+        if not fnames or not all(os.path.exists(f) for f in fnames):
+            return False
+        if time.time() - max(os.path.getmtime(f) for f in fnames) < self.settle:
+            return False
+        try:
+            for f in fnames:
+                h5py.File(f, "r").close()
+        except OSError:
+            return False
+        return True
+
+    def pending(self) -> List[int]:
+        """
+        Find the complete steps which some of the reductions have not processed yet.
+
+        Returns
+        -------
+        `List[int]`
+            the sorted list of steps
+        """
+        plugin = self.plugin(**self.kwargs)
+        return [
+            s
+            for s in plugin.availableSteps()
+            if any(s not in self.done[name] for name in self.reductions)
+            and self.ready(s, plugin)
+        ]
+
+    def process(self, steps: List[int]) -> None:
+        """
+        Compute the reductions for the given steps, append their results to the store and checkpoint the progress.
+
+        Parameters
+        ----------
+        `steps` : `List[int]`
+            the steps
+        """
+        from contextlib import redirect_stdout
+        from .data import Data
+        import dask
+        import io
+
+        with redirect_stdout(io.StringIO()):
+            data = Data(self.plugin, steps=steps, first_step=steps[0], **self.kwargs)
+        try:
+            lazy = {}
+            for name, func in self.reductions.items():
+                todo = [i for i, s in enumerate(steps) if s not in self.done[name]]
+                if todo:
+                    result = func(data)
+                    if "t" not in result.dims or result.sizes["t"] != len(steps):
+                        raise ValueError(
+                            f"Reduction `{name}` must return an array with a `t` dimension of the steps"
+                        )
+                    lazy[name] = (result.isel(t=todo), [steps[i] for i in todo])
+            computed = dask.compute(
+                {name: r for name, (r, _) in lazy.items()}, scheduler=self.scheduler
+            )[0]
+        finally:
+            # a long-running watcher must not accumulate the files of the processed steps
+            data.plugin.close()
+        for name, (_, done) in lazy.items():
+            self.append(name, computed[name], done)
+            self.done[name] += done
+        self.writeCheckpoint()
+
+    def append(self, name: str, result: Any, steps: List[int]) -> None:
+        import numpy as np
+        import h5py
+
+        result = result.transpose("t", ...)
+        with h5py.File(self.store, "a") as store:
+            if name not in store:
+                group = store.create_group(name)
+                for k, shape, dtype in [
+                    ("step", (), np.int64),
+                    ("t", (), np.float64),
+                    ("values", result.shape[1:], result.dtype),
+                ]:
+                    group.create_dataset(
+                        k, shape=(0, *shape), maxshape=(None, *shape), dtype=dtype
+                    )
+                group.attrs["dims"] = list(result.dims[1:])
+                for d in result.dims[1:]:
+                    if d in result.coords:
+                        group.create_dataset(f"coords/{d}", data=result[d].values)
+            group = store[name]
+            # rows past the checkpoint are left over from an interrupted batch
+            start = len(self.done[name])
+            for k, values in [
+                ("step", np.array(steps)),
+                ("t", result.t.values),
+                ("values", result.values),
+            ]:
+                group[k].resize(start + len(steps), axis=0)
+                group[k][start:] = values
+
+    def run(
+        self, poll: float = 10.0, timeout: float | None = None, once: bool = False
+    ) -> None:
+        """
+        Watch the simulation output and process the new steps as they land.
+
+        Parameters
+        ----------
+        `poll` : `float`, optional
+            seconds between checks for new steps (default: `10`)
+        `timeout` : `float`, optional
+            stop after this many seconds without new steps (default: `None`, run until interrupted)
+        `once` : `bool`, optional
+            process the steps available now and return (default: `False`)
+        """
+        import logging
+        import time
+
+        idle = time.time()
+        try:
+            while True:
+                steps = self.pending()
+                for i in range(0, len(steps), self.batch_size):
+                    batch = steps[i : i + self.batch_size]
+                    self.process(batch)
+                    logging.info(f"Processed steps {batch[0]}...{batch[-1]}")
+                if once:
+                    return
+                if steps:
+                    idle = time.time()
+                elif timeout is not None and time.time() - idle > timeout:
+                    return
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            pass
+
+    def results(self, name: str) -> Any:
+        """
+        Read the results of a reduction.
+
+        Parameters
+        ----------
+        `name` : `str`
+            the name of the reduction
+
+        Returns
+        -------
+        `xr.DataArray`
+            the results of all the processed steps, sorted by step
+        """
+        import numpy as np
+        import xarray as xr
+        import h5py
+
+        with h5py.File(self.store, "r") as store:
+            group = store[name]
+            nrows = len(self.done.get(name, []))
+            steps = group["step"][:nrows]
+            order = np.argsort(steps)
+            dims = list(group.attrs["dims"])
+            return xr.DataArray(
+                group["values"][:nrows][order],
+                dims=["t", *dims],
+                coords={
+                    "t": group["t"][:nrows][order],
+                    "step": ("t", steps[order]),
+                    **{
+                        d: group[f"coords/{d}"][()]
+                        for d in dims
+                        if f"coords/{d}" in group
+                    },
+                },
+                name=name,
+            )